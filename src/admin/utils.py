@@ -1,6 +1,7 @@
 import os
 import logging
 import sys
+import time
 import datetime
 import gc
 from functools import reduce
@@ -120,6 +121,55 @@ class memory_snapshot:
         see_tensors_in_memory(self.ndim, self.summary, self.cuda)
 
 
+class saved_tensors_bytes:
+    '''
+    Counts the bytes autograd saves for the backward pass inside the block,
+    each storage once. Tensors saved inside checkpointed segments are not
+    counted, since they are not kept.
+    '''
+    def __enter__(self):
+        self.storages = {}
+        self.hooks = torch.autograd.graph.saved_tensors_hooks(self.pack, lambda x: x)
+        self.hooks.__enter__()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.hooks.__exit__(type, value, traceback)
+
+    def pack(self, tensor):
+        storage = tensor.untyped_storage()
+        self.storages[storage.data_ptr()] = storage.nbytes()
+        return tensor
+
+    @property
+    def bytes(self):
+        return sum(self.storages.values())
+
+def synchronize():
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+def time_call(fn, reps=5, warmup=1):
+    '''Mean wall time of fn() in seconds, after warmup calls'''
+    for _ in range(warmup):
+        fn()
+    synchronize()
+    t = time.time()
+    for _ in range(reps):
+        fn()
+    synchronize()
+    return (time.time() - t) / reps
+
+def peak_cuda_memory(fn):
+    '''Peak allocated CUDA memory in bytes during fn(), or None without a GPU'''
+    if not torch.cuda.is_available():
+        return None
+    synchronize()
+    torch.cuda.reset_peak_memory_stats()
+    fn()
+    synchronize()
+    return torch.cuda.max_memory_allocated()
+
 def format_bytes(n):
     n = str(int(n))
     if len(n) < 4:
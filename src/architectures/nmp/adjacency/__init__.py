@@ -3,6 +3,8 @@ from .combo import ComboAdjacency, LearnedComboAdjacency
 
 def construct_adjacency(matrix, **kwargs):
     if isinstance(matrix, (list,)):
+        if 'linear' in matrix:
+            raise ValueError('The linear adjacency is never formed as a matrix and cannot be combined: {}'.format(matrix))
         if kwargs.get('learned_tradeoff', False):
             return LearnedComboAdjacency(adj_list=matrix, **kwargs)
         return ComboAdjacency(adj_list=matrix, **kwargs)
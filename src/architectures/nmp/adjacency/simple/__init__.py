@@ -1,8 +1,10 @@
 from .learned import LEARNED_ADJACENCIES
 from .constant import CONSTANT_ADJACENCIES
 from .physics import PHYSICS_ADJACENCIES
+from .linear import LINEAR_ADJACENCIES
 
 SIMPLE_ADJACENCIES = {}
 SIMPLE_ADJACENCIES.update(LEARNED_ADJACENCIES)
 SIMPLE_ADJACENCIES.update(CONSTANT_ADJACENCIES)
 SIMPLE_ADJACENCIES.update(PHYSICS_ADJACENCIES)
+SIMPLE_ADJACENCIES.update(LINEAR_ADJACENCIES)
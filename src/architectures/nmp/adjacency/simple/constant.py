@@ -1,5 +1,5 @@
 import torch
-from torch.autograd import Variable
+from src.data_ops.constant_cache import ones, eye, batched
 from ._adjacency import _Adjacency
 
 
@@ -12,11 +12,7 @@ class Ones(_Adjacency):
 
     def raw_matrix(self, vertices):
         bs, sz, _ = vertices.size()
-        matrix = Variable(torch.ones(bs, sz, sz))
-        if torch.cuda.is_available():
-            matrix = matrix.cuda()
-        #print('one')
-        return matrix
+        return batched(ones(sz, dtype=vertices.dtype, device=vertices.device), bs)
         #if mask is None:
         #    return matrix
         #return mask * matrix
@@ -30,10 +26,7 @@ class Eye(_Adjacency):
 
     def raw_matrix(self, vertices):
         bs, sz, _ = vertices.size()
-        matrix = Variable(torch.eye(sz).unsqueeze(0).repeat(bs, 1, 1))
-        if torch.cuda.is_available():
-            matrix = matrix.cuda()
-        return matrix
+        return batched(eye(sz, dtype=vertices.dtype, device=vertices.device), bs)
         #if mask is None:
         #    return matrix
         #return mask * matrix
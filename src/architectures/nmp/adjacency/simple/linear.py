@@ -0,0 +1,66 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from ._adjacency import _Adjacency
+
+
+def elu_feature_map(x):
+    return F.elu(x) + 1
+
+
+class LowRankAdjacency:
+    '''
+    Row-normalised adjacency A = phi(Q) phi(K)^T / (phi(Q) phi(K)^T 1) kept in factored form.
+    Inputs:
+        q, k <- (batch_size) * M * D nonnegative features, zero on padded vertices
+    matmul(x) gives torch.matmul(A, x) in O(M * D^2) without forming the M * M matrix.
+    '''
+    def __init__(self, q, k):
+        self.q = q
+        self.k = k
+
+    def matmul(self, x):
+        kx = torch.bmm(self.k.transpose(1, 2), x)
+        z = torch.bmm(self.q, self.k.sum(1).unsqueeze(2))
+        return torch.bmm(self.q, kx) / z.clamp(min=1e-10)
+
+    def to_dense(self):
+        A = torch.bmm(self.q, self.k.transpose(1, 2))
+        return A / A.sum(2, keepdim=True).clamp(min=1e-10)
+
+
+class LinearAttentional(_Adjacency):
+    '''
+    Softmax-like attention adjacency with the exponential kernel replaced by
+    the feature map elu(x) + 1, so A . m can be computed right to left.
+    The matrix activation does not apply; the rows are normalised by construction.
+    '''
+    def __init__(self, dim_in, dim_out=None, index='', **kwargs):
+        name='lin'+index
+        super().__init__(name=name, **kwargs)
+        if dim_out is None: dim_out = dim_in
+        self.query = nn.Linear(dim_in, dim_out)
+        self.key = nn.Linear(dim_in, dim_out)
+        if kwargs.get('wn', False):
+            self.query = nn.utils.weight_norm(self.query, name='weight')
+            self.key = nn.utils.weight_norm(self.key, name='weight')
+
+    def initialize(self, name=None, symmetric=None, act=None, **kwargs):
+        self.name = name
+        self.symmetric = False
+        self.activation = None
+
+    def forward(self, h, mask=None, **kwargs):
+        q = elu_feature_map(self.query(h))
+        k = elu_feature_map(self.key(h))
+        if mask is not None:
+            # the first column of the mask marks the real vertices
+            vertices = mask[:, :, :1]
+            q = q * vertices
+            k = k * vertices
+        return LowRankAdjacency(q, k)
+
+LINEAR_ADJACENCIES = dict(
+    linear=LinearAttentional,
+)
@@ -1,7 +1,10 @@
 import torch
 import torch.nn.functional as F
 
+from src.data_ops.precision import full_precision
 
+
+@full_precision
 def padded_matrix_softmax(matrix, mask):
     '''
     Inputs:
@@ -11,25 +14,36 @@ def padded_matrix_softmax(matrix, mask):
         S <- (batch_size) * M * M tensor, where S[n, i] is a probability distribution over the
             values 1, ..., M. The softmax is taken over each row of the
             matrix, and the padded values have been assigned probability 0.
+            Rows with no unmasked entries are all zeros.
     '''
-    #
-    #S = F.softmax(matrix.transpose(0, -1)).transpose(0, -1)
-    S = F.softmax(matrix, dim=2)
-    if mask is not None:
-        S = S * mask
-        Z = S.sum(2, keepdim=True) + 1e-10
-        S = S / Z
-    return S
+    if mask is None:
+        return F.softmax(matrix, dim=2)
+
+    # masked entries go to -inf once, so they never enter the exponentials
+    S = matrix.masked_fill(mask == 0, -float('inf'))
+
+    # shifting by the row max does not change the softmax, so the shift needs no gradient.
+    # fully masked rows have max -inf: shift those by 0 so they exponentiate to zeros
+    row_max = S.detach().max(2, keepdim=True)[0]
+    row_max.masked_fill_(row_max == -float('inf'), 0)
+    S.sub_(row_max)
+    S.exp_()
+
+    Z = S.sum(2, keepdim=True).clamp(min=1e-10)
+    if S.requires_grad:
+        # exp_ saved its output for the backward pass
+        return S / Z
+    return S.div_(Z)
 
 def masked_function(fn):
     def masked(matrix, mask):
         if mask is None:
             return fn(matrix)
-        return fn(matrix) * mask
+        return fn(matrix).masked_fill(mask == 0, 0)
     return masked
 
 def no_mask_softmax(matrix, mask):
-    return F.softmax(-matrix.transpose(0, -1)).transpose(0, -1)
+    return padded_matrix_softmax(-matrix, None)
 
 MATRIX_ACTIVATIONS = {
     'mask': masked_function(lambda x: x),
@@ -4,22 +4,16 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
-from src.data_ops.wrapping import wrap
+from src.data_ops.constant_cache import entry_distance_matrix, batched
 
 from .message_passing import MP_LAYERS
 from .adjacency import construct_adjacency
-from ....architectures.readout import READOUTS
-from ....architectures.embedding import EMBEDDINGS
+from src.architectures.readout import READOUTS
+from src.architectures.embedding import EMBEDDINGS
 
-from ....monitors import Histogram
-from ....monitors import Collect
-from ....monitors import BatchMatrixMonitor
-
-def entry_distance_matrix(n):
-    A = torch.triu(torch.ones(n, n), 0)
-    A = torch.mm(A, A)
-    A = A + torch.triu(A,1).transpose(0,1)
-    return A
+from src.monitors import Histogram
+from src.monitors import Collect
+from src.monitors import BatchMatrixMonitor
 
 def upper_to_lower_diagonal_ones(n):
     A = torch.eye(n)
@@ -56,10 +50,7 @@ class GeneratorNMP(nn.Module):
         h = self.embedding(x)
 
         #A = upper_to_lower_diagonal_ones(n_vertices)
-        A = entry_distance_matrix(n_vertices)
-
-        A = A.unsqueeze(0).repeat(bs, 1, 1)
-        A = wrap(A)
+        A = batched(entry_distance_matrix(n_vertices, dtype=x.dtype, device=x.device), bs)
 
         with torch.no_grad():
             for i, mp in enumerate(self.mp_layers[:-1]):
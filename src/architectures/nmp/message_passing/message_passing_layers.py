@@ -25,6 +25,18 @@ class MessagePassingLayer(nn.Module):
         del message
         return h
 
+class ImplicitMessagePassingLayer(MessagePassingLayer):
+    '''
+    Message passing with an adjacency that is never formed as a dense tensor.
+    A is any object with A.matmul(x) equal to torch.matmul(A_dense, x),
+    e.g. the LowRankAdjacency returned by the linear adjacency.
+    '''
+    def forward(self, h=None, A=None):
+        message = self.activation(A.matmul(self.message(h)))
+        h = self.vertex_update(h, message)
+        del message
+        return h
+
 class MessagePassingLayerSpatial(nn.Module):
     def __init__(self, hidden=None, update=None, message=None, act=None, **kwargs):
         super().__init__()
@@ -84,6 +96,7 @@ class GraphAttentionalLayer(nn.Module):
 
 MP_LAYERS = dict(
     m1=MessagePassingLayer,
+    m1i=ImplicitMessagePassingLayer,
     m1s=MessagePassingLayerSpatial,
     attn=GraphAttentionalLayer,
     m2=MessagePassingLayer2
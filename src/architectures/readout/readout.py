@@ -6,28 +6,33 @@ import torch.nn.functional as F
 from .set2set import Set2Vec
 
 class Readout(nn.Module):
-    def __init__(self, hidden_dim, target_dim):
+    '''
+    Readouts take h (batch_size, n_nodes, hidden_dim) and optionally the padding
+    mask (batch_size, n_nodes, n_nodes) that is passed to the adjacencies.
+    Readout-specific options come in as keyword arguments and are ignored by the others.
+    '''
+    def __init__(self, hidden_dim, target_dim, **kwargs):
         super().__init__()
         self.hidden_dim = hidden_dim
         self.target_dim = target_dim
 
-    def forward(self, h):
+    def forward(self, h, mask=None):
         pass
 
 class Constant(Readout):
-    def __init__(self, hidden_dim, target_dim):
+    def __init__(self, hidden_dim, target_dim, **kwargs):
         super().__init__(hidden_dim, target_dim)
 
-    def forward(self, h):
+    def forward(self, h, mask=None):
         return h
 
 class DTNNReadout(Readout):
-    def __init__(self, hidden_dim, target_dim):
+    def __init__(self, hidden_dim, target_dim, **kwargs):
         super().__init__(hidden_dim, target_dim)
         self.fc1 = nn.Linear(hidden_dim, hidden_dim)
         self.fc2 = nn.Linear(hidden_dim, target_dim)
 
-    def forward(self, x):
+    def forward(self, x, mask=None):
         bs, n_nodes, n_hidden = (s for s in x.size())
         x = self.fc1(x)
         x = F.tanh(x)
@@ -36,31 +41,31 @@ class DTNNReadout(Readout):
         return x
 
 class SimpleReadout(Readout):
-    def __init__(self, hidden_dim, target_dim):
+    def __init__(self, hidden_dim, target_dim, **kwargs):
         super().__init__(hidden_dim, target_dim)
         self.fc = nn.Linear(hidden_dim, target_dim)
 
-    def forward(self, x):
+    def forward(self, x, mask=None):
         x = self.fc(x)
         x = F.tanh(x)
         x = x.mean(1)
         return x
 
 class ClassificationReadout(Readout):
-    def __init__(self, hidden_dim, *args):
+    def __init__(self, hidden_dim, *args, **kwargs):
         super().__init__(hidden_dim, 1)
         self.fc = nn.Linear(hidden_dim, 1)
 
-    def forward(self, x):
+    def forward(self, x, mask=None):
         return F.sigmoid(self.fc(x))
 
 class MultipleReadout(Readout):
-    def __init__(self, hidden_dim, target_dim, n_readouts):
+    def __init__(self, hidden_dim, target_dim, n_readouts, **kwargs):
         super().__init__(hidden_dim, target_dim)
         #self.readouts = nn.ModuleList([SimpleReadout(hidden_dim, target_dim) for i in range(n_readouts)])
         self.fc = nn.Linear(hidden_dim, target_dim * n_readouts)
 
-    def forward(self, x):
+    def forward(self, x, mask=None):
         #x = torch.stack([r(x) for r in self.readouts], 1)
         bs, n_in, dim_in = x.size()
         x = F.tanh(self.fc(x))
@@ -69,12 +74,15 @@ class MultipleReadout(Readout):
         return x
 
 class SetReadout(Readout):
-    def __init__(self, hidden_dim, target_dim):
+    def __init__(self, hidden_dim, target_dim, steps=None, **kwargs):
         super().__init__(hidden_dim, target_dim)
-        self.set2vec = Set2Vec(hidden_dim, target_dim, hidden_dim)
+        self.set2vec = Set2Vec(hidden_dim, target_dim, hidden_dim, steps=steps)
 
-    def forward(self, h):
-        x = self.set2vec(h)
+    def forward(self, h, mask=None):
+        if mask is not None:
+            # the first column of the mask marks the real nodes
+            mask = mask[:, :, 0]
+        x = self.set2vec(h, mask)
         return x
 
 READOUTS = dict(
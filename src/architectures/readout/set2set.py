@@ -4,23 +4,29 @@ import torch.nn.functional as F
 from torch.autograd import Variable
 
 class Set2Vec(nn.Module):
-    def __init__(self, input_dim, output_dim, memory_dim):
+    def __init__(self, input_dim, output_dim, memory_dim, steps=None):
         super().__init__()
         #self.input_dim, self.output_dim, self.memory_dim = input_dim, output_dim, memory_dim
+        self.steps = steps
 
         self.embedding = nn.Sequential(nn.Linear(input_dim, memory_dim), nn.ReLU(), nn.Linear(memory_dim, memory_dim))
         self.process = ProcessBlock(2 * memory_dim)
         self.write = nn.Linear(2 * memory_dim, output_dim)
 
-    def forward(self, x):
-        ''' x has shape (batch_size, seq_length, feature_dim) '''
+    def forward(self, x, mask=None):
+        '''
+        x has shape (batch_size, seq_length, feature_dim)
+        mask has shape (batch_size, seq_length), with zeros on the padded elements
+        '''
         # embed each element of sequence into a memory vector
         m = self.embedding(x) # m has shape (bs, L, mem_dim)
-        # process the memories with content-based attention
-        q = Variable(torch.zeros(m.size()[0], 2 * m.size()[2]))
-        if torch.cuda.is_available(): q = q.cuda()
-        for t in range(x.size()[1]):
-            q = self.process(q, m)
+        # process the memories with content-based attention, for a fixed
+        # number of steps, or (steps = None, as in older models) one step per
+        # element of the padded sequence
+        q = m.new_zeros(m.size()[0], 2 * m.size()[2])
+        steps = x.size()[1] if self.steps is None else self.steps
+        for t in range(steps):
+            q = self.process(q, m, mask)
         # readout from the final hidden state
         output = self.write(q)
         return output
@@ -31,14 +37,20 @@ class ProcessBlock(nn.Module):
         super().__init__()
         self.recurrent = NoInputGRUCell(input_dim)
 
-    def lookup(self, q, m):
-        return torch.matmul(m, q.unsqueeze(2)).squeeze(2)
+    def attend(self, q, m, mask=None):
+        '''
+        softmax(m q) read from m, over the real elements only. The lookup,
+        masked softmax and read run as one fused attention kernel, with no
+        scaling of the scores.
+        '''
+        if mask is not None:
+            mask = (mask != 0).unsqueeze(1)
+        r = F.scaled_dot_product_attention(q.unsqueeze(1), m, m, attn_mask=mask, scale=1.)
+        return r.squeeze(1)
 
-    def forward(self, q, m):
+    def forward(self, q, m, mask=None):
         q_hat, _ = self.recurrent(q).chunk(2, 1)
-        e = self.lookup(q_hat, m)
-        a = F.softmax(e)
-        r = torch.sum(a.unsqueeze(2) * m, 1)
+        r = self.attend(q_hat, m, mask)
         q = torch.cat([q_hat, r], 1)
         return q
 
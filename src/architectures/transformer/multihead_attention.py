@@ -1,26 +1,16 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from torch.nn import init
-from ...utils import Attention
-from ...utils import BottleLinear as Linear
+from ..utils import Attention
+from ..utils import BottleLinear as Linear
 
 class MultiHeadAttention(nn.Module):
-    def __init__(self, n_head, d_k, d_v, d_model, dropout=False, **kwargs):
+    def __init__(self, n_head, d_k, d_v, d_model, dropout=0., **kwargs):
         super().__init__()
-        #self.query_weights_list = nn.Linear(n_heads * dim_hidden, n_heads * dim_query, bias=False)
-        #self.key_weights_list = nn.Linear(n_heads * dim_hidden, n_heads * dim_query, bias=False)
-        #self.value_weights_list = nn.Linear(n_heads * dim_hidden, n_heads * dim_value, bias=False)
-        #self.wqs = nn.ModuleList([nn.Linear(dim_hidden, dim_query, bias=False) for _ in range(n_heads)])
-        #self.wks = nn.ModuleList([nn.Linear(dim_hidden, dim_query, bias=False) for _ in range(n_heads)])
-        #self.wvs = nn.ModuleList([nn.Linear(dim_hidden, dim_value, bias=False) for _ in range(n_heads)])
-        #self.wo = nn.Linear(n_heads * dim_value, dim_hidden, bias=False)
-        self.wqs = nn.Parameter(torch.FloatTensor(n_head, d_model, d_k))
-        self.wks = nn.Parameter(torch.FloatTensor(n_head, d_model, d_k))
-        self.wvs = nn.Parameter(torch.FloatTensor(n_head, d_model, d_v))
-
-        init.xavier_normal(self.wqs)
-        init.xavier_normal(self.wks)
-        init.xavier_normal(self.wvs)
+        # one projection for the queries, keys and values of all the heads
+        self.w_qkv = nn.Linear(d_model, n_head * (2 * d_k + d_v), bias=False)
+        init.xavier_normal(self.w_qkv.weight)
 
         self.n_head = n_head
         self.d_k = d_k
@@ -30,41 +20,53 @@ class MultiHeadAttention(nn.Module):
         self.proj = Linear(n_head*d_v, d_model)
         self.dropout = nn.Dropout(dropout)
 
-    def forward(self, q, k, v):
+    def split_heads(self, x, d):
+        # mb_size x len x (n_head*d) -> (mb_size*n_head) x len x d
+        mb_size, length, _ = x.size()
+        return x.view(mb_size, length, self.n_head, d).transpose(1, 2).contiguous().view(-1, length, d)
+
+    def merge_heads(self, x, mb_size):
+        # (mb_size*n_head) x len x d -> mb_size x len x (n_head*d)
+        _, length, d = x.size()
+        return x.view(mb_size, self.n_head, length, d).transpose(1, 2).contiguous().view(mb_size, length, -1)
+
+    def forward(self, q, k, v, mask=None):
+        '''
+        q, k, v have size mb_size x len x d_model.
+        mask (optional) has size mb_size x 1 x len_k (or mb_size x len_q x len_k),
+        with zeros on the keys to be ignored.
+        '''
         d_k, d_v = self.d_k, self.d_v
         n_head = self.n_head
+        mb_size = q.size()[0]
 
-        mb_size, len_q, d_model = q.size()
-        mb_size, len_k, d_model = k.size()
-        mb_size, len_v, d_model = v.size()
+        sizes = [n_head * d_k, n_head * d_k, n_head * d_v]
+        if q is k and k is v:
+            # self attention: a single matmul for every head of q, k and v
+            q_s, k_s, v_s = self.w_qkv(q).split(sizes, dim=-1)
+        else:
+            w_q, w_k, w_v = self.w_qkv.weight.split(sizes, dim=0)
+            q_s, k_s, v_s = F.linear(q, w_q), F.linear(k, w_k), F.linear(v, w_v)
 
-        # treat as a (n_head) size batch
-        q_s = q.repeat(n_head, 1, 1).view(n_head, -1, d_model) # n_head x (mb_size*len_q) x d_model
-        k_s = k.repeat(n_head, 1, 1).view(n_head, -1, d_model) # n_head x (mb_size*len_k) x d_model
-        v_s = v.repeat(n_head, 1, 1).view(n_head, -1, d_model) # n_head x (mb_size*len_v) x d_model
+        # treat the result as a (mb_size * n_head) size batch
+        q_s = self.split_heads(q_s, d_k)   # (mb_size*n_head) x len_q x d_k
+        k_s = self.split_heads(k_s, d_k)   # (mb_size*n_head) x len_k x d_k
+        v_s = self.split_heads(v_s, d_v)   # (mb_size*n_head) x len_v x d_v
 
-        # treat the result as a (n_head * mb_size) size batch
-        q_s = torch.bmm(q_s, self.wqs).view(-1, len_q, d_k)   # (n_head*mb_size) x len_q x d_k
-        k_s = torch.bmm(k_s, self.wks).view(-1, len_k, d_k)   # (n_head*mb_size) x len_k x d_k
-        v_s = torch.bmm(v_s, self.wvs).view(-1, len_v, d_v)   # (n_head*mb_size) x len_v x d_v
+        if mask is not None:
+            mask = mask.unsqueeze(1).expand(mb_size, n_head, *mask.size()[1:])
+            mask = mask.contiguous().view(-1, *mask.size()[2:])
 
-        # perform attention, result size = (n_head * mb_size) x len_q x d_v
-        outputs, attns = self.attention(q_s, k_s, v_s)
+        # perform attention, result size = (mb_size * n_head) x len_q x d_v
+        # the scale is fixed: one that counted the (padded) keys would make
+        # each example depend on the padding of its batch
+        outputs, attns = self.attention(q_s, k_s, v_s, mask=mask, scale=d_k ** -0.5)
 
         # back to original mb_size batch, result size = mb_size x len_q x (n_head*d_v)
-        outputs = torch.cat(torch.split(outputs, mb_size, dim=0), dim=-1)
+        outputs = self.merge_heads(outputs, mb_size)
 
         # project back to residual size
         outputs = self.proj(outputs)
         outputs = self.dropout(outputs)
 
-        #heads = []
-        #for wq, wk, wv in zip(self.wqs, self.wks, self.wvs):
-        #    hq = wq(q)
-        #    hk = wk(k)
-        #    hv = wv(v)
-        #    head, _ = self.attention(hq, hk, hv)
-        #    heads.append(head)
-        #heads = torch.cat(heads, 2)
-        #output = self.wo(heads)
         return outputs
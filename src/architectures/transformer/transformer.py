@@ -2,7 +2,15 @@ import torch
 import torch.nn as nn
 
 from .multihead_attention import MultiHeadAttention
-from ...utils.layer_norm import LayerNorm
+from ..utils.layer_norm import LayerNorm
+
+def key_padding_mask(lengths, n):
+    '''
+    lengths <- (B,) number of real nodes in each example
+    Returns a (B, 1, n) mask with ones on the real nodes.
+    '''
+    positions = torch.arange(n, device=lengths.device).unsqueeze(0)
+    return (positions < lengths.unsqueeze(1)).unsqueeze(1)
 
 class Transformer(nn.Module):
     def __init__(self,
@@ -14,15 +22,20 @@ class Transformer(nn.Module):
         super().__init__()
         self.transformer_layers = nn.ModuleList([SelfAttentionLayer(hidden, n_heads, **kwargs) for _ in range(n_layers)])
 
-    def forward(self, x, **kwargs):
+    def forward(self, x, lengths=None, **kwargs):
         '''
         x has dimension (B, N, D) where
             B = batch size
             N = number of nodes
             D = model dimension
+        lengths (optional) has dimension (B,) and gives the number of real nodes;
+        the padded nodes are then masked out of every attention.
         '''
+        mask = None
+        if lengths is not None:
+            mask = key_padding_mask(lengths, x.size()[1])
         for transformer_layer in self.transformer_layers:
-            x = transformer_layer(x)
+            x = transformer_layer(x, mask)
         return x
 
 class SelfAttentionLayer(nn.Module):
@@ -37,8 +50,8 @@ class SelfAttentionLayer(nn.Module):
                     )
         self.ln2 = LayerNorm(hidden)
 
-    def forward(self, x):
-        x = x + self.multihead_attention(x, x, x)
+    def forward(self, x, mask=None):
+        x = x + self.multihead_attention(x, x, x, mask=mask)
         x = self.ln1(x)
         x = x + self.ff(x)
         x = self.ln2(x)
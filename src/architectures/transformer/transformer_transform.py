@@ -4,8 +4,8 @@ import torch.nn.functional as F
 
 from .transformer import Transformer
 
-from ....architectures.readout import READOUTS
-from ....architectures.embedding import EMBEDDINGS
+from src.architectures.readout import READOUTS
+from src.architectures.embedding import EMBEDDINGS
 
 class TransformerTransform(nn.Module):
     def __init__(self,
@@ -23,11 +23,16 @@ class TransformerTransform(nn.Module):
         self.embedding = EMBEDDINGS['n'](dim_in=features, dim_out=hidden, n_layers=int(emb_init), **emb_kwargs)
 
         #self.embedding = EMBEDDINGS['n'](dim_in=features, dim_out=hidden, **emb_kwargs)
-        self.readout = READOUTS[readout](hidden, hidden)
+        self.readout = READOUTS[readout](hidden, hidden, steps=kwargs.get('readout_steps', None))
         self.transformer = Transformer(hidden, n_heads, n_layers, **kwargs)
+        self.predictor = READOUTS['clf'](hidden, None)
 
-    def forward(self, jets, **kwargs):
+    def forward(self, x, **kwargs):
+        jets, mask = x
+        # the first row of the padding mask marks the real nodes
+        lengths = mask[:, 0].sum(1).long()
         h = self.embedding(jets)
-        h = self.transformer(h)
-        out = self.readout(h)
-        return out
+        h = self.transformer(h, lengths=lengths)
+        out = self.readout(h, mask=mask)
+        outputs = self.predictor(out)
+        return outputs
@@ -1,7 +1,10 @@
+import logging
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.autograd import Variable
+from torch.utils.checkpoint import checkpoint
 
 def dot(a, b):
     """Compute the dot product between pairs of vectors in 3D Variables.
@@ -19,29 +22,44 @@ def dot(a, b):
     return a.bmm(b.transpose(1, 2))
 
 class Attention(nn.Module):
-    def __init__(self):
+    '''
+    Dot-product attention that never holds the full (B, M, N) score matrix.
+    Queries are processed in tiles of chunk_size, and within a tile the keys
+    are swept in tiles with an online softmax (running max and sum). Under
+    autograd each query tile is checkpointed and recomputed in the backward pass.
+    Set return_attention when the weights themselves are needed; that path
+    forms the full matrix, and is not tiled (e.g. AttentionPooling, which
+    pools the adjacency matrices with the weights).
+    '''
+    def __init__(self, chunk_size=256):
         super().__init__()
+        self.chunk_size = chunk_size
 
-    def forward(self, query, key, value, dimensions=None):
+    def forward(self, query, key, value, mask=None, scale=None, return_attention=False):
         ''' Input:
             query vectors q_1, ..., q_m
             key vectors k_1, .., k_n
             value vectors v_1, ..., v_n
 
-            all of equal dimension and batch size.
+            all of equal batch size, queries and keys of equal dimension.
+            mask (optional) is (batch, 1, n) or (batch, m, n), with zeros on the
+            keys each query should ignore.
 
             Compute the attention weights alpha_ij as follows:
 
-            score_ij = (q_j)^T k_i
+            score_ij = scale * (q_j)^T k_i
             alpha_ij = exp(score_ij) / sum_k exp(score_ik)
 
             Then apply the attention weights to v_1, ..., v_n as follows:
 
             output_ij = sum_k (alpha_ik * v_kj)
+
+            The scale defaults to sqrt(n), as it always has here.
+            Returns the output and the attention weights (None unless return_attention).
         '''
         bsk, n_keys, dim_key = key.size()
         bsq, n_queries, dim_query = query.size()
-        bsv, n_queries, dim_value = value.size()
+        bsv, n_values, dim_value = value.size()
 
         try:
             assert bsq == bsk == bsv
@@ -55,24 +73,63 @@ class Attention(nn.Module):
                 but should be equal'.format(bsq, bsk, bsv))
             raise e
         try:
-            assert dim_key == dim_query == dim_value
+            assert dim_key == dim_query
         except AssertionError as e:
             logging.debug(
                 'Mismatch: \
                 query data dimension = {}, \
-                key data dimension = {}, \
-                value data dimension = {} \
-                but should be equal'.format(dim_query, dim_key, dim_value))
+                key data dimension = {} \
+                but should be equal'.format(dim_query, dim_key))
             raise e
-        #import ipdb; ipdb.set_trace()
-        s = dot(query, key)
-        if dimensions is None:
-            dimensions  = Variable(torch.FloatTensor([key.size()[1]]).view(1, 1, 1).expand_as(s))
-        if torch.cuda.is_available():
-            dimensions = dimensions.cuda()
-        scaling_factor = torch.sqrt(1 / dimensions)
-        alpha = F.softmax(s / scaling_factor, dim=2)
-        #alpha = alpha.transpose(0,2)
-        #import ipdb; ipdb.set_trace()
+
+        if scale is None:
+            scale = n_keys ** 0.5
+
+        if return_attention:
+            return self.attend(query, key, value, mask, scale)
+
+        needs_grad = torch.is_grad_enabled() and any(x.requires_grad for x in (query, key, value))
+        outputs = []
+        for start in range(0, n_queries, self.chunk_size):
+            q = query[:, start:start + self.chunk_size]
+            m = mask
+            if mask is not None and mask.size()[1] > 1:
+                m = mask[:, start:start + self.chunk_size]
+            if needs_grad and n_queries * n_keys > self.chunk_size ** 2:
+                out = checkpoint(self.attend_in_tiles, q, key, value, m, scale, use_reentrant=False)
+            else:
+                out = self.attend_in_tiles(q, key, value, m, scale)
+            outputs.append(out)
+        output = outputs[0] if len(outputs) == 1 else torch.cat(outputs, 1)
+        return output, None
+
+    def attend(self, query, key, value, mask, scale):
+        s = dot(query, key) * scale
+        if mask is not None:
+            s = s.masked_fill(mask == 0, -float('inf'))
+        alpha = F.softmax(s, dim=2)
         output = torch.bmm(alpha, value)
         return output, alpha
+
+    def attend_in_tiles(self, query, key, value, mask, scale):
+        bs, n_queries, _ = query.size()
+        row_max = query.new_full((bs, n_queries, 1), -float('inf'))
+        row_sum = query.new_zeros(bs, n_queries, 1)
+        output = query.new_zeros(bs, n_queries, value.size()[2])
+        for start in range(0, key.size()[1], self.chunk_size):
+            end = start + self.chunk_size
+            s = dot(query, key[:, start:end]) * scale
+            if mask is not None:
+                s = s.masked_fill(mask[:, :, start:end] == 0, -float('inf'))
+
+            # the shift cancels in the softmax, so it is kept out of the graph.
+            # queries that have only seen masked keys so far are shifted by 0
+            tile_max = torch.max(row_max, s.detach().max(2, keepdim=True)[0])
+            shift = tile_max.masked_fill(tile_max == -float('inf'), 0)
+            p = torch.exp(s - shift)
+            correction = torch.exp(row_max - shift)
+
+            row_sum = row_sum * correction + p.sum(2, keepdim=True)
+            output = output * correction + torch.bmm(p, value[:, start:end])
+            row_max = tile_max
+        return output / row_sum.clamp(min=1e-10)
@@ -0,0 +1,46 @@
+import torch
+from torch.nn.modules.batchnorm import _BatchNorm
+from torch.utils.checkpoint import checkpoint
+
+def _run_segment(layers, x, *args):
+    for layer in layers:
+        x = layer(x, *args)
+    return x
+
+def _batch_norm_buffers(layers):
+    return [b for layer in layers for m in layer.modules() if isinstance(m, _BatchNorm) for b in m.buffers(recurse=False)]
+
+def _checkpoint_segment(layers, x, *args):
+    '''
+    Checkpoint a segment of layers. The batch norm running statistics are
+    saved before the recomputation in the backward pass and restored after
+    it, so that they are updated once per step, as without checkpointing.
+    '''
+    buffers = _batch_norm_buffers(layers)
+    calls = []
+    def segment(x, *args):
+        if not buffers or not calls:
+            calls.append(True)
+            return _run_segment(layers, x, *args)
+        saved = [b.clone() for b in buffers]
+        try:
+            return _run_segment(layers, x, *args)
+        finally:
+            with torch.no_grad():
+                for b, value in zip(buffers, saved):
+                    b.copy_(value)
+    return checkpoint(segment, x, *args, use_reentrant=False)
+
+def run_layers(layers, x, *args, every=0):
+    '''
+    x = layer(x, *args) for each layer in turn.
+
+    With every = k > 0, and gradients enabled, the layers are run in segments
+    of k under torch.utils.checkpoint: only the input of each segment is kept,
+    and the activations inside it are recomputed in the backward pass.
+    '''
+    if not every or not torch.is_grad_enabled():
+        return _run_segment(layers, x, *args)
+    for start in range(0, len(layers), every):
+        x = _checkpoint_segment(layers[start:start + every], x, *args)
+    return x
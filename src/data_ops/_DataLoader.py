@@ -1,8 +1,11 @@
 from torch.utils.data import DataLoader
 
 class _DataLoader(DataLoader):
-    def __init__(self, dataset, batch_size):
-        super().__init__(dataset, batch_size, collate_fn=self.collate)
+    def __init__(self, dataset, batch_size, batch_sampler=None):
+        if batch_sampler is None:
+            super().__init__(dataset, batch_size, collate_fn=self.collate)
+        else:
+            super().__init__(dataset, batch_sampler=batch_sampler, collate_fn=self.collate)
 
     def collate(self, xy_pairs):
         X = self.preprocess_x([x for x, _ in xy_pairs])
@@ -0,0 +1,78 @@
+'''
+Cache for the constant tensors that forward passes would otherwise rebuild
+on every batch (identity and ones matrices, distance grids, ...).
+
+Tensors are keyed by (kind, shape, dtype, device) and evicted least recently
+used first. They are shared between callers, so treat them as read-only and
+use broadcast views (expand) instead of repeat to add a batch dimension.
+'''
+from collections import OrderedDict
+
+import torch
+
+
+class ConstantCache:
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.tensors = OrderedDict()
+
+    def get(self, kind, shape, dtype, device, build):
+        key = (kind, tuple(shape), dtype, str(device))
+        try:
+            tensor = self.tensors.pop(key)
+        except KeyError:
+            with torch.no_grad():
+                tensor = build(*shape).to(device=device, dtype=dtype)
+        self.tensors[key] = tensor
+        while len(self.tensors) > self.maxsize:
+            self.tensors.popitem(last=False)
+        return tensor
+
+    def clear(self):
+        self.tensors.clear()
+
+CONSTANT_CACHE = ConstantCache()
+
+def default_device():
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+def cached_constant(kind, shape, build, dtype=torch.float32, device=None):
+    if device is None:
+        device = default_device()
+    return CONSTANT_CACHE.get(kind, shape, dtype, device, build)
+
+def _entry_distance_matrix(n):
+    A = torch.triu(torch.ones(n, n), 0)
+    A = torch.mm(A, A)
+    A = A + torch.triu(A,1).transpose(0,1)
+    return A
+
+def _band_distances(n):
+    # |i - j| for an n x n grid
+    idx = torch.arange(n).float()
+    return (idx.unsqueeze(1) - idx.unsqueeze(0)).abs()
+
+def _spatial_grid(n):
+    s = torch.stack([torch.arange(n).float(), torch.zeros(n), torch.zeros(n)], 1)
+    s = s - s.mean(0, keepdim=True)
+    return s / n
+
+def ones(n, **kwargs):
+    return cached_constant('ones', (n, n), torch.ones, **kwargs)
+
+def eye(n, **kwargs):
+    return cached_constant('eye', (n,), torch.eye, **kwargs)
+
+def entry_distance_matrix(n, **kwargs):
+    return cached_constant('entry_distance', (n,), _entry_distance_matrix, **kwargs)
+
+def band_distances(n, power=1, **kwargs):
+    if power == 1:
+        return cached_constant('band_distances', (n,), _band_distances, **kwargs)
+    return cached_constant('band_distances**{}'.format(power), (n,), lambda n: _band_distances(n) ** power, **kwargs)
+
+def spatial_grid(n, **kwargs):
+    return cached_constant('spatial_grid', (n,), _spatial_grid, **kwargs)
+
+def batched(tensor, bs):
+    return tensor.unsqueeze(0).expand(bs, *tensor.size())
@@ -0,0 +1,28 @@
+import torch
+
+def batch_lengths(mask):
+    '''Lengths of the examples of a padded batch, read off its B x N x N mask'''
+    return mask.diagonal(dim1=1, dim2=2).sum(1).long()
+
+def chunk_batch(mask, size):
+    '''
+    Split a padded batch, with B x N x N mask, into micro-batches of at most
+    size examples, yielded as their indices. The micro-batches keep the
+    padded length N of the batch.
+    '''
+    for indices in torch.arange(mask.size(0), device=mask.device).split(size):
+        yield indices
+
+def batch_shape(batch):
+    '''
+    (number of examples, padded length) of a collated batch, read off the
+    first B x N x ... tensor in it, or None if it has none (e.g. batched trees)
+    '''
+    if torch.is_tensor(batch):
+        return tuple(batch.shape[:2]) if batch.dim() == 3 else None
+    if isinstance(batch, (tuple, list)):
+        for item in batch:
+            shape = batch_shape(item)
+            if shape is not None:
+                return shape
+    return None
@@ -0,0 +1,32 @@
+import functools
+
+import torch
+
+def autocast_device_type():
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+def autocast(enabled=True):
+    '''
+    bfloat16 autocast on the device the models run on.
+    With enabled = False this is a no-op context.
+    '''
+    return torch.autocast(autocast_device_type(), dtype=torch.bfloat16, enabled=enabled)
+
+def _to_float(x):
+    if torch.is_tensor(x) and x.is_floating_point():
+        return x.float()
+    return x
+
+def full_precision(fn):
+    '''
+    Decorator for numerically sensitive functions: floating point tensor
+    arguments are cast to float32 and fn runs with autocast disabled.
+    Outside autocast the casts are no-ops.
+    '''
+    @functools.wraps(fn)
+    def wrapped(*args, **kwargs):
+        args = [_to_float(x) for x in args]
+        kwargs = {k: _to_float(v) for k, v in kwargs.items()}
+        with torch.autocast(autocast_device_type(), enabled=False):
+            return fn(*args, **kwargs)
+    return wrapped
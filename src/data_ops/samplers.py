@@ -0,0 +1,86 @@
+import numpy as np
+from torch.utils.data import Sampler
+
+class LengthBucketBatchSampler(Sampler):
+    '''
+    Batches of indices of examples with similar lengths, so that little
+    of each padded batch is padding. The examples are sorted by length and
+    cut into consecutive batches of batch_size; with shuffle set, the order
+    of the batches is shuffled every epoch.
+    '''
+    def __init__(self, lengths, batch_size, shuffle=False):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def batches(self):
+        order = np.argsort(self.lengths, kind='stable')
+        return [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+    def __iter__(self):
+        batches = self.batches()
+        if self.shuffle:
+            batches = [batches[i] for i in np.random.permutation(len(batches))]
+        for batch in batches:
+            yield batch.tolist()
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+class TokenBudgetBatchSampler(Sampler):
+    '''
+    Batches of indices under a memory budget rather than of a fixed size:
+    a batch of B examples whose longest has length L costs B * L ** 2, the
+    size of its padded N x N tensors, and holds as many examples as fit in
+    budget (an example over budget on its own is a batch of one).
+
+    The examples are cut into mega-batches of mega_batch examples, shuffled
+    every epoch if shuffle is set, and sorted by length within each, so that
+    batches are both random and tightly padded. Their number varies from
+    epoch to epoch: len() is that of the last epoch iterated over (or of the
+    first, before any).
+    '''
+    def __init__(self, lengths, budget, mega_batch=1024, shuffle=False):
+        self.lengths = np.asarray(lengths)
+        if budget < 1:
+            raise ValueError("The token budget must be positive, got {}".format(budget))
+        self.budget = budget
+        self.mega_batch = mega_batch
+        self.shuffle = shuffle
+        self._batches = self.batches()
+        self._fresh = True
+
+    def batches(self):
+        if self.shuffle:
+            order = np.random.permutation(len(self.lengths))
+        else:
+            order = np.arange(len(self.lengths))
+
+        batches = []
+        for i in range(0, len(order), self.mega_batch):
+            mega_batch = order[i:i + self.mega_batch]
+            mega_batch = mega_batch[np.argsort(self.lengths[mega_batch], kind='stable')]
+            batch, max_length = [], 0
+            for idx in mega_batch:
+                length = max(max_length, self.lengths[idx])
+                if batch and (len(batch) + 1) * length ** 2 > self.budget:
+                    batches.append(batch)
+                    batch, length = [], self.lengths[idx]
+                batch.append(int(idx))
+                max_length = length
+            if batch:
+                batches.append(batch)
+
+        if self.shuffle:
+            batches = [batches[i] for i in np.random.permutation(len(batches))]
+        return batches
+
+    def __iter__(self):
+        if not self._fresh:
+            self._batches = self.batches()
+        self._fresh = False
+        for batch in self._batches:
+            yield batch
+
+    def __len__(self):
+        return len(self._batches)
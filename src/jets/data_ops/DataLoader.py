@@ -10,8 +10,8 @@ from src.data_ops.wrapping import wrap
 
 
 class DataLoader(_DataLoader):
-    def __init__(self, dataset, batch_size, leaves=True, dropout=None, permute_particles=False, **kwargs):
-        super().__init__(dataset, batch_size)
+    def __init__(self, dataset, batch_size, leaves=True, dropout=None, permute_particles=False, batch_sampler=None, **kwargs):
+        super().__init__(dataset, batch_size, batch_sampler=batch_sampler)
         self.dropout = dropout
         self.permute_particles = permute_particles
         self.leaves = leaves
@@ -24,6 +24,9 @@ class DataLoader(_DataLoader):
             return self.dataset.dim
             
     def preprocess_y(self, y_list):
+        if any(y is None for y in y_list):
+            # unlabelled jets, e.g. when scoring
+            return None
         y = torch.stack([torch.Tensor([int(y)]) for y in y_list], 0)
         if y.size()[1] == 1:
             y = y.squeeze(1)
@@ -4,6 +4,20 @@ import numpy as np
 import math
 
 from sklearn.preprocessing import RobustScaler
+
+class Scaler:
+    '''
+    Standardises jet constituents with the per-feature mean and standard
+    deviation of a training set. A plain object so that it can be pickled
+    with the model settings and reused at scoring time.
+    '''
+    def __init__(self, mean, std):
+        self.mean = mean
+        self.std = std
+
+    def __call__(self, x):
+        return (x - self.mean) / self.std
+
 class Dataset(D):
     def __init__(self, jets, weights=None, problem=None, subproblem=None):
         super().__init__()
@@ -29,6 +43,10 @@ class Dataset(D):
     def dim(self):
         return self.jets[0].constituents.shape[1]
 
+    @property
+    def lengths(self):
+        return [len(jet) for jet in self.jets]
+
     def extend(self, dataset):
         self.jets = self.jets + dataset.jets
 
@@ -38,16 +56,7 @@ class Dataset(D):
 
     def get_scaler(self):
         constituents = np.concatenate([j.constituents for j in self.jets], 0)
-        min_x = constituents.min(0)
-        max_x = constituents.max(0)
-        mean_x = constituents.mean(0)
-        std_x = constituents.std(0)
-        def tf(x):
-            x = (x - mean_x) / std_x
-            return x
-
-        self.tf = tf
-
+        self.tf = Scaler(constituents.mean(0), constituents.std(0))
         return self.tf
 
     def transform(self, tf=None):
@@ -0,0 +1,122 @@
+'''
+Export a trained jet model to a frozen TorchScript file, and benchmark it
+against the eager model.
+
+    python export_jets.py -m <model dir> [-o model.pt] [-b 1 64 1024]
+
+The exported module takes the raw padded constituents (B, N, D + 1), whose
+last channel flags padding, and the (B, N, N) mask; the input normalization
+saved with the model is folded into it. It loads with torch.jit.load alone.
+'''
+if __name__ == '__main__':
+    import matplotlib as mpl
+    mpl.use('Agg')
+import argparse
+import logging
+import os
+import sys
+import time
+sys.path.append('../..')
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.misc.constants import *
+from src.admin.utils import time_call
+from src.utils.model_loading import load_model
+from src.utils.export import freeze_for_inference, trace_and_save
+from src.data_ops.pad_tensors import pad_tensors_extra_channel
+from src.jets.models import MODEL_DICT
+from src.jets.score.score_jets import get_normalization
+
+class NormalizedJetModel(nn.Module):
+    '''
+    A jet model with its input normalization folded in, so that it takes the
+    padded raw constituents. Padded rows stay zero, as in the data loader.
+    '''
+    def __init__(self, model, normalization):
+        super().__init__()
+        self.model = model
+        self.register_buffer('mean', torch.as_tensor(normalization.mean, dtype=torch.float32))
+        self.register_buffer('std', torch.as_tensor(normalization.std, dtype=torch.float32))
+
+    def forward(self, jets, mask):
+        padding = jets[:, :, -1:]
+        x = (jets[:, :, :-1] - self.mean) / self.std * (1 - padding)
+        return self.model((torch.cat([x, padding], 2), mask))
+
+def random_jets(batch_size, max_n, dim):
+    '''Padded random constituents and mask, with lengths up to max_n (one of them max_n)'''
+    lengths = np.random.randint(1, max_n + 1, size=batch_size)
+    lengths[0] = max_n
+    return pad_tensors_extra_channel([torch.randn(int(n), dim) for n in lengths])
+
+def cold_start(load, jets, mask):
+    t = time.time()
+    model = load()
+    with torch.inference_mode():
+        model(jets, mask)
+    return time.time() - t
+
+def main(sysargvlist=None):
+    parser = argparse.ArgumentParser(description='Export a jet model to TorchScript')
+
+    parser.add_argument("-v", "--verbose", action='store_true', default=False)
+
+    # Directory args
+    parser.add_argument("--data_dir", type=str, default=DATA_DIR)
+    parser.add_argument("--models_dir", default=MODELS_DIR)
+    parser.add_argument("--dataset", type=str, default='w', help='training set to rebuild the normalization from, if the model has none saved')
+    parser.add_argument("-m", "--model", type=str, required=True, help="model directory, relative to models_dir")
+    parser.add_argument("-o", "--output", type=str, default=None, help="output file (default: model.pt in the model directory)")
+
+    # Example inputs and benchmark
+    parser.add_argument("--max_n", type=int, default=100, help='maximum number of constituents of the example jets')
+    parser.add_argument("-b", "--batch_sizes", type=int, nargs='+', default=[1, 64, 1024])
+    parser.add_argument("--reps", type=int, default=20)
+
+    if sysargvlist is None:
+        args = parser.parse_args()
+    else:
+        args = parser.parse_args(sysargvlist)
+
+    # export for CPU inference
+    os.environ['CUDA_VISIBLE_DEVICES'] = ''
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    model_dir = os.path.join(args.models_dir, args.model)
+    output = args.output if args.output is not None else os.path.join(model_dir, 'model.pt')
+
+    def load_eager():
+        model, settings = load_model(MODEL_DICT, model_dir)
+        model = freeze_for_inference(model)
+        return NormalizedJetModel(model, get_normalization(settings, args.data_dir, args.dataset)).eval()
+
+    model = load_eager()
+    dim = model.mean.numel()
+
+    example = random_jets(8, args.max_n, dim)
+    checks = [random_jets(3, args.max_n // 2 + 1, dim), random_jets(1, 1, dim)]
+    traced = trace_and_save(model, example, output, check_inputs=checks)
+
+    with torch.inference_mode():
+        diff = max(float((model(*x) - traced(*x)).abs().max()) for x in [example] + checks)
+    logging.info("Max abs difference between eager and exported outputs: {:.2e}".format(diff))
+
+    jets, mask = random_jets(1, args.max_n, dim)
+    logging.info("Cold start (load + first batch): eager {:.1f} ms, exported {:.1f} ms".format(
+        1000 * cold_start(load_eager, jets, mask),
+        1000 * cold_start(lambda: torch.jit.load(output), jets, mask)))
+
+    exported = torch.jit.load(output)
+    with torch.inference_mode():
+        for batch_size in args.batch_sizes:
+            jets, mask = random_jets(batch_size, args.max_n, dim)
+            t_eager = time_call(lambda: model(jets, mask), reps=args.reps)
+            t_exported = time_call(lambda: exported(jets, mask), reps=args.reps)
+            logging.info("Batch size {:>5}: eager {:.2f} ms, exported {:.2f} ms per batch".format(
+                batch_size, 1000 * t_eager, 1000 * t_exported))
+
+if __name__ == "__main__":
+    main()
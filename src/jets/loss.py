@@ -1,4 +1,7 @@
 import torch.nn.functional as F
 
+from src.data_ops.precision import full_precision
+
+@full_precision
 def loss(y_pred, y):
     return F.binary_cross_entropy(y_pred.squeeze(1), y)
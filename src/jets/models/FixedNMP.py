@@ -16,6 +16,7 @@ from src.architectures.nmp.message_passing import MP_LAYERS
 from src.architectures.nmp.adjacency import construct_adjacency
 from src.architectures.readout import READOUTS
 from src.architectures.embedding import EMBEDDINGS
+from src.architectures.utils import run_layers
 
 from src.monitors import Histogram
 from src.monitors import Collect
@@ -33,6 +34,7 @@ class FixedNMP(nn.Module):
         mp_layer=None,
         tied=False,
         no_grad=False,
+        checkpoint=0,
         **kwargs
         ):
 
@@ -40,11 +42,13 @@ class FixedNMP(nn.Module):
 
         self.iters = iters
         self.no_grad = no_grad
+        self.checkpoint = checkpoint
         emb_kwargs = {x: kwargs.get(x, None) for x in ['act', 'wn']}
         self.embedding = EMBEDDINGS['n'](dim_in=features, dim_out=hidden, n_layers=int(emb_init), **emb_kwargs)
 
         mp_kwargs = {x: kwargs.get(x, None) for x in ['act', 'wn', 'update', 'message']}
-        MPLayer = MP_LAYERS['m1']
+        # the linear adjacency stays factored, so it needs the matching layer
+        MPLayer = MP_LAYERS['m1i' if matrix == 'linear' else 'm1']
         if tied:
             mp = MPLayer(hidden=hidden,**mp_kwargs)
             self.mp_layers = nn.ModuleList([mp for _ in range(iters)])
@@ -55,7 +59,7 @@ class FixedNMP(nn.Module):
         adj_kwargs = {x: kwargs.get(x, None) for x in ['symmetric', 'logger', 'logging_frequency', 'wn']}
         adj_kwargs['act'] = kwargs['m_act']
         self.adjacency_matrix = construct_adjacency(matrix=matrix, dim_in=features, dim_out=hidden, **adj_kwargs)
-        self.readout = Readout(hidden, hidden)
+        self.readout = Readout(hidden, hidden, steps=kwargs.get('readout_steps', None))
 
         self.predictor = READOUTS['clf'](hidden, None)
 
@@ -63,8 +67,7 @@ class FixedNMP(nn.Module):
         jets, mask = x
         h = self.embedding(jets)
         dij = self.adjacency_matrix(jets, mask=mask, **kwargs)
-        for mp in self.mp_layers:
-            h = mp(h=h, A=dij)
-        out = self.readout(h)
+        h = run_layers(self.mp_layers, h, dij, every=self.checkpoint)
+        out = self.readout(h, mask=mask)
         outputs = self.predictor(out)
         return outputs
@@ -0,0 +1,83 @@
+import torch
+import torch.nn as nn
+from torch.nn import init
+
+from src.architectures.transformer.multihead_attention import MultiHeadAttention
+from src.architectures.utils.layer_norm import LayerNorm
+from src.architectures.readout import READOUTS
+from src.architectures.embedding import EMBEDDINGS
+
+
+class AttentionBlock(nn.Module):
+    '''
+    x attends to y, followed by a feedforward layer, both residual and layer normed.
+    '''
+    def __init__(self, hidden, n_heads=None, dq=None, dv=None, **kwargs):
+        super().__init__()
+        self.multihead_attention = MultiHeadAttention(n_heads, dq, dv, hidden, **kwargs)
+        self.ln1 = LayerNorm(hidden)
+        self.ff = nn.Sequential(
+                    nn.Linear(hidden, 4 * hidden),
+                    nn.ReLU(),
+                    nn.Linear(4 * hidden, hidden)
+                    )
+        self.ln2 = LayerNorm(hidden)
+
+    def forward(self, x, y, mask=None):
+        x = self.ln1(x + self.multihead_attention(x, y, y, mask=mask))
+        x = self.ln2(x + self.ff(x))
+        return x
+
+class InducedSetAttentionBlock(nn.Module):
+    '''
+    m learned inducing points attend to the N nodes, then the nodes attend to
+    the inducing points: O(N * m) instead of O(N^2).
+    '''
+    def __init__(self, hidden, n_inducing, **kwargs):
+        super().__init__()
+        self.inducing_points = nn.Parameter(torch.FloatTensor(1, n_inducing, hidden))
+        init.xavier_normal(self.inducing_points)
+        self.summarize = AttentionBlock(hidden, **kwargs)
+        self.broadcast = AttentionBlock(hidden, **kwargs)
+
+    def forward(self, x, mask=None):
+        inducing_points = self.inducing_points.expand(x.size()[0], -1, -1)
+        h = self.summarize(inducing_points, x, mask=mask)
+        x = self.broadcast(x, h)
+        return x
+
+class InducedSetTransformer(nn.Module):
+    def __init__(self,
+        features=None,
+        hidden=None,
+        n_layers=None,
+        n_inducing=None,
+        readout=None,
+        emb_init=None,
+        **kwargs
+        ):
+
+        super().__init__()
+
+        emb_kwargs = {x: kwargs.get(x, None) for x in ['act', 'wn']}
+        self.embedding = EMBEDDINGS['n'](dim_in=features, dim_out=hidden, n_layers=int(emb_init), **emb_kwargs)
+
+        block_kwargs = {x: kwargs[x] for x in ['n_heads', 'dq', 'dv']}
+        block_kwargs['dropout'] = kwargs.get('dropout', 0.)
+        self.blocks = nn.ModuleList([InducedSetAttentionBlock(hidden, n_inducing, **block_kwargs) for _ in range(n_layers)])
+
+        Readout = READOUTS[readout]
+        self.readout = Readout(hidden, hidden, steps=kwargs.get('readout_steps', None))
+
+        self.predictor = READOUTS['clf'](hidden, None)
+
+    def forward(self, x, **kwargs):
+        jets, mask = x
+        h = self.embedding(jets)
+        # the first row of the padding mask marks the real nodes
+        key_mask = mask[:, :1]
+        for block in self.blocks:
+            h = block(h, mask=key_mask)
+        out = self.readout(h, mask=mask)
+        outputs = self.predictor(out)
+        return outputs
@@ -1,5 +1,9 @@
 from .FixedNMP import FixedNMP
+from .InducedSetTransformer import InducedSetTransformer
+from src.architectures.transformer import TransformerTransform
 
 MODEL_DICT = dict(
     nmp=FixedNMP,
+    tf=TransformerTransform,
+    ist=InducedSetTransformer,
 )
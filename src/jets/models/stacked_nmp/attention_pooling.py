@@ -17,12 +17,15 @@ class RecurrentAttentionPooling(nn.Module):
         self.attn = Attention()
         self.recurrent_cell = nn.GRUCell(hidden, hidden)
 
-    def forward(self, h):
+    def forward(self, h, mask=None, **kwargs):
+        ''' mask (optional) is the (B, N, N) padding mask of h '''
+        if mask is not None:
+            mask = mask[:, :1]
         z = self.readout(h)
         hiddens_out = []
         for t in range(self.nodes_out):
             z = z.unsqueeze(1)
-            attn_out, _ = self.attn(z, h, h)
+            attn_out, _ = self.attn(z, h, h, mask=mask)
             z = z.squeeze(1)
             attn_out = attn_out.squeeze(1)
             z = self.recurrent_cell(attn_out, z)
@@ -46,9 +49,15 @@ class AttentionPooling(nn.Module):
         self.monitor.initialize(None, os.path.join(logger.plotsdir, 'attention'))
 
 
-    def forward(self, h, **kwargs):
+    def forward(self, h, mask=None, **kwargs):
+        ''' mask (optional) is the (B, N, N) padding mask of h '''
+        if mask is not None:
+            mask = mask[:, :1]
         z = self.readout(h)
-        new_hiddens, attns = self.attn(z, h, h)
+        # the weights are returned to pool the adjacency matrices, so this
+        # takes the dense path: (B, nodes_out, N), small next to the (B, N, N)
+        # adjacency they pool
+        new_hiddens, attns = self.attn(z, h, h, mask=mask, return_attention=True)
 
         self.logging(attn=attns)
 
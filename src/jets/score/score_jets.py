@@ -0,0 +1,116 @@
+if __name__ == '__main__':
+    import matplotlib as mpl
+    mpl.use('Agg')
+import argparse
+import logging
+import os
+import sys
+import time
+sys.path.append('../..')
+
+import numpy as np
+import torch
+
+from src.misc.constants import *
+from src.utils.model_loading import load_model
+from src.utils.export import quantize_model
+from src.data_ops.samplers import LengthBucketBatchSampler
+from src.jets.models import MODEL_DICT
+from src.jets.data_ops.DataLoader import DataLoader
+from src.jets.data_ops.Dataset import Dataset
+from src.jets.data_ops.Jet import Jet
+from src.jets.data_ops.io import load_jet_dicts_from_pickle
+from src.jets.data_ops.get_data_loader import training_and_validation_dataset
+
+def get_normalization(settings, data_dir, dataset):
+    normalization = settings.get('normalization', None)
+    if normalization is None:
+        # models trained before the normalization was saved
+        logging.warning("No saved normalization in the model settings: rebuilding it from the '{}' training set".format(dataset))
+        train_dataset, _ = training_and_validation_dataset(data_dir, dataset, -1, 27000, False)
+        normalization = train_dataset.tf
+    return normalization
+
+def score(model, data_loader, batch_sampler, out):
+    '''
+    Writes the model output for every example of data_loader.dataset into out,
+    at the example's index. batch_sampler must be the (deterministic) sampler
+    of data_loader.
+    '''
+    model.eval()
+    with torch.inference_mode():
+        for indices, (x, _) in zip(batch_sampler, data_loader):
+            y_pred = model(x)
+            out[indices] = y_pred.float().view(-1).cpu().numpy()
+    return out
+
+def score_in_chunks(model, jet_dicts, normalization, batch_size, chunk_size, out):
+    '''
+    Scores jet_dicts into out, chunk_size jets at a time: only one chunk is
+    held as normalized Jets and batches, its dicts are released once they
+    are converted, and its scores are flushed to out before the next chunk.
+    '''
+    for start in range(0, len(jet_dicts), chunk_size):
+        stop = min(start + chunk_size, len(jet_dicts))
+        dataset = Dataset([Jet(**jd) for jd in jet_dicts[start:stop]])
+        jet_dicts[start:stop] = [None] * (stop - start)
+        dataset.transform(normalization)
+
+        batch_sampler = LengthBucketBatchSampler(dataset.lengths, batch_size)
+        data_loader = DataLoader(dataset, batch_size, batch_sampler=batch_sampler)
+        score(model, data_loader, batch_sampler, out[start:stop])
+        out.flush()
+        logging.info("Scored {} of {} jets".format(stop, len(jet_dicts)))
+    return out
+
+def main(sysargvlist=None):
+    parser = argparse.ArgumentParser(description='Score jets with a trained model')
+
+    parser.add_argument("-v", "--verbose", action='store_true', default=False)
+
+    # Directory args
+    parser.add_argument("--data_dir", type=str, default=DATA_DIR)
+    parser.add_argument("--models_dir", default=MODELS_DIR)
+    parser.add_argument("--dataset", type=str, default='w', help='training set to rebuild the normalization from, if the model has none saved')
+
+    # Model, input and output
+    parser.add_argument("-m", "--model", type=str, required=True, help="model directory, relative to models_dir")
+    parser.add_argument("-i", "--input", type=str, required=True, help="pickled list of jet dicts")
+    parser.add_argument("-o", "--output", type=str, required=True, help=".npy file for the scores")
+
+    # Computing args
+    parser.add_argument("-b", "--batch_size", type=int, default=1024)
+    parser.add_argument("--chunk_size", type=int, default=100000, help='number of jets converted and scored at a time')
+    parser.add_argument("-g", "--gpu", type=str, default="")
+    parser.add_argument("--quantize", action='store_true', help='dynamic int8 quantization (CPU only)')
+
+    if sysargvlist is None:
+        args = parser.parse_args()
+    else:
+        args = parser.parse_args(sysargvlist)
+
+    os.environ['CUDA_VISIBLE_DEVICES'] = '' if args.quantize else args.gpu
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    model_dir = os.path.join(args.models_dir, args.model)
+    model, settings = load_model(MODEL_DICT, model_dir)
+    if args.quantize:
+        model = quantize_model(model)
+    elif torch.cuda.is_available():
+        model.cuda()
+    logging.info("Loaded {}".format(model_dir))
+
+    jet_dicts = load_jet_dicts_from_pickle(args.input)
+    n_jets = len(jet_dicts)
+    normalization = get_normalization(settings, args.data_dir, args.dataset)
+    logging.info("Scoring {} jets from {}".format(n_jets, args.input))
+
+    out = np.lib.format.open_memmap(args.output, mode='w+', dtype=np.float32, shape=(n_jets,))
+
+    t = time.time()
+    score_in_chunks(model, jet_dicts, normalization, args.batch_size, args.chunk_size, out)
+    t = time.time() - t
+    logging.info("Scored {} jets in {:.1f} seconds ({:.1f} jets per second). Saved to {}".format(n_jets, t, n_jets / t, args.output))
+
+if __name__ == "__main__":
+    main()
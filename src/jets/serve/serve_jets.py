@@ -0,0 +1,268 @@
+'''
+Local scoring daemon for single jets.
+
+Requests are newline-delimited JSON objects over a Unix or TCP socket:
+    {"id": 7, "constituents": [[...], [...], ...]}  ->  {"id": 7, "score": 0.93}
+    {"stats": true}                                  ->  {"p50_ms": ..., "p99_ms": ..., ...}
+Requests from every connection are pooled into micro-batches, bounded by a
+maximum batch size and a maximum wait after the first request of the batch.
+Within a micro-batch, jets are scored in groups of equal length, so a jet's
+score does not depend on the requests it is batched with.
+'''
+if __name__ == '__main__':
+    import matplotlib as mpl
+    mpl.use('Agg')
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append('../..')
+
+import numpy as np
+import torch
+
+from src.misc.constants import *
+from src.utils.model_loading import load_model
+from src.data_ops.pad_tensors import pad_tensors_extra_channel
+from src.data_ops.wrapping import wrap
+from src.jets.models import MODEL_DICT
+from src.jets.score.score_jets import get_normalization
+
+class LatencyStats:
+    '''Latencies of the most recent requests, and request/batch/queue counters'''
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def enqueued(self):
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def dequeued(self, n):
+        self.queue_depth -= n
+        self.batches += 1
+
+    def answered(self, latency):
+        self.requests += 1
+        self.latencies.append(latency)
+
+    def summary(self):
+        if len(self.latencies) > 0:
+            p50, p99 = np.percentile(self.latencies, [50, 99]) * 1000
+        else:
+            p50 = p99 = float('nan')
+        return dict(
+            p50_ms=float(p50),
+            p99_ms=float(p99),
+            requests=self.requests,
+            batches=self.batches,
+            mean_batch_size=self.requests / max(self.batches, 1),
+            queue_depth=self.queue_depth,
+            max_queue_depth=self.max_queue_depth,
+        )
+
+class JetScorer:
+    '''
+    Scores a list of constituent arrays. The jets are grouped by length and
+    each group is scored as one batch with no padding: the readouts average
+    over padded nodes, so padding a jet to the longest of its batch would
+    make its score depend on the other requests.
+    '''
+    def __init__(self, model, normalization):
+        self.model = model.eval()
+        self.normalization = normalization
+
+    def __call__(self, constituents_list):
+        groups = {}
+        for i, c in enumerate(constituents_list):
+            groups.setdefault(len(c), []).append(i)
+        scores = [None] * len(constituents_list)
+        for indices in groups.values():
+            data = [torch.from_numpy(self.normalization(constituents_list[i])).float() for i in indices]
+            data, mask = pad_tensors_extra_channel(data)
+            with torch.inference_mode():
+                y_pred = self.model((wrap(data), wrap(mask)))
+            for i, score in zip(indices, y_pred.float().view(-1).cpu().tolist()):
+                scores[i] = score
+        return scores
+
+class MicroBatcher:
+    '''
+    Queues requests and runs them through score_fn in batches of at most
+    max_batch_size, waiting at most max_wait seconds after the first request
+    of a batch for more to arrive. score_fn runs in a single worker thread,
+    so the event loop keeps accepting requests meanwhile. With n_features
+    set, requests of another width are rejected before they are queued, so
+    that they cannot fail the batch they would join.
+    '''
+    def __init__(self, score_fn, max_batch_size=64, max_wait=0.002, n_features=None):
+        self.score_fn = score_fn
+        self.n_features = n_features
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.stats = LatencyStats()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, constituents):
+        future = asyncio.get_running_loop().create_future()
+        self.stats.enqueued()
+        await self.queue.put((constituents, future, time.time()))
+        return await future
+
+    async def next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.next_batch()
+            self.stats.dequeued(len(batch))
+            try:
+                scores = await loop.run_in_executor(self.executor, self.score_fn, [c for c, _, _ in batch])
+            except Exception as e:
+                logging.exception("Scoring a batch of {} failed".format(len(batch)))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            t = time.time()
+            for (_, future, t0), score in zip(batch, scores):
+                if not future.done():
+                    future.set_result(score)
+                self.stats.answered(t - t0)
+
+async def answer(batcher, line):
+    request = None
+    try:
+        request = json.loads(line)
+        if request.get('stats', False):
+            return batcher.stats.summary()
+        constituents = np.asarray(request['constituents'], dtype=np.float32)
+        if constituents.ndim != 2 or len(constituents) == 0:
+            raise ValueError('constituents must be a non-empty list of feature vectors, got shape {}'.format(constituents.shape))
+        if batcher.n_features is not None and constituents.shape[1] != batcher.n_features:
+            raise ValueError('constituents must have {} features, got {}'.format(batcher.n_features, constituents.shape[1]))
+        score = await batcher.submit(constituents)
+        return dict(id=request.get('id', None), score=score)
+    except Exception as e:
+        request_id = request.get('id', None) if isinstance(request, dict) else None
+        return dict(id=request_id, error=str(e))
+
+def connection_handler(batcher):
+    async def handle(reader, writer):
+        async def respond(line):
+            response = await answer(batcher, line)
+            writer.write((json.dumps(response) + '\n').encode())
+            await writer.drain()
+
+        tasks = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            # requests on one connection are answered as they finish, matched by id
+            task = asyncio.ensure_future(respond(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+    return handle
+
+async def log_stats(batcher, every):
+    while True:
+        await asyncio.sleep(every)
+        logging.info(' '.join('{}={:.4g}'.format(k, v) for k, v in batcher.stats.summary().items()))
+
+async def serve(batcher, socket_path=None, host=None, port=None, stats_every=60):
+    handle = connection_handler(batcher)
+    if socket_path is not None:
+        server = await asyncio.start_unix_server(handle, path=socket_path)
+        logging.info("Listening on {}".format(socket_path))
+    else:
+        server = await asyncio.start_server(handle, host=host, port=port)
+        logging.info("Listening on {}:{}".format(host, port))
+    # the event loop only keeps weak references to tasks: hold on to them,
+    # and stop serving if the batcher dies rather than hang every request
+    serve_task = asyncio.ensure_future(server.serve_forever())
+    batcher_task = asyncio.ensure_future(batcher.run())
+    tasks = [serve_task, batcher_task]
+    if stats_every > 0:
+        tasks.append(asyncio.ensure_future(log_stats(batcher, stats_every)))
+    try:
+        async with server:
+            done, _ = await asyncio.wait([serve_task, batcher_task], return_when=asyncio.FIRST_COMPLETED)
+            if batcher_task in done:
+                batcher_task.result()
+                raise RuntimeError("The batcher stopped")
+            serve_task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        batcher.executor.shutdown(wait=False)
+
+def main(sysargvlist=None):
+    parser = argparse.ArgumentParser(description='Serve jet scores over a socket')
+
+    parser.add_argument("-v", "--verbose", action='store_true', default=False)
+
+    # Directory args
+    parser.add_argument("--data_dir", type=str, default=DATA_DIR)
+    parser.add_argument("--models_dir", default=MODELS_DIR)
+    parser.add_argument("--dataset", type=str, default='w', help='training set to rebuild the normalization from, if the model has none saved')
+    parser.add_argument("-m", "--model", type=str, required=True, help="model directory, relative to models_dir")
+
+    # Socket args
+    parser.add_argument("--socket", type=str, default=None, help="path of a Unix socket (default: TCP on host:port)")
+    parser.add_argument("--host", type=str, default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8765)
+
+    # Batching args
+    parser.add_argument("--max_batch", type=int, default=64)
+    parser.add_argument("--max_wait_ms", type=float, default=2.)
+    parser.add_argument("--stats_every", type=float, default=60., help='seconds between stats log lines (0: never)')
+    parser.add_argument("-g", "--gpu", type=str, default="")
+
+    if sysargvlist is None:
+        args = parser.parse_args()
+    else:
+        args = parser.parse_args(sysargvlist)
+
+    os.environ['CUDA_VISIBLE_DEVICES'] = args.gpu
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    model_dir = os.path.join(args.models_dir, args.model)
+    model, settings = load_model(MODEL_DICT, model_dir)
+    if torch.cuda.is_available():
+        model.cuda()
+    logging.info("Loaded {}".format(model_dir))
+
+    scorer = JetScorer(model, get_normalization(settings, args.data_dir, args.dataset))
+    # the model's input has an extra padding channel
+    n_features = settings['model_kwargs']['features'] - 1
+    batcher = MicroBatcher(scorer, max_batch_size=args.max_batch, max_wait=args.max_wait_ms / 1000, n_features=n_features)
+
+    asyncio.run(serve(batcher, socket_path=args.socket, host=args.host, port=args.port, stats_every=args.stats_every))
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,3 @@
 from .test_monitors import test_monitor_collection
 from .test_argument_converter import test_argument_converter
+from .quantization import compare_quantized
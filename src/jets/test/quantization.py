@@ -0,0 +1,16 @@
+import logging
+
+from src.monitors import ROCAUC, InvFPR
+
+def compare_quantized(logdict, quantized_logdict):
+    '''
+    Given the validation logdicts of a model and of its quantized copy on the
+    same data, the differences (quantized - float) of their ROC AUC and
+    inverse FPR.
+    '''
+    deltas = {}
+    for metric in [ROCAUC(), InvFPR()]:
+        f, q = float(metric(**logdict)), float(metric(**quantized_logdict))
+        deltas[metric.name + '_delta'] = q - f
+        logging.info("{}: float {:.5f}, int8 {:.5f}, delta {:+.5f}".format(metric.name, f, q, q - f))
+    return deltas
@@ -43,7 +43,7 @@ def get_admin_kwargs(args):
         silent=args.silent,
         verbose=args.verbose,
         cmd_line_args=args.cmd_line_args,
-        monitor_collection=test_monitor_collection(),
+        monitor_collection=test_monitor_collection(quantize=args.quantize),
         arg_string=args.arg_string,
         root_dir=args.root_dir,
     )
@@ -62,6 +62,9 @@ def main(sysargvlist=None):
     #computing = parser.add_argument_group('computing')
     parser.add_argument("--seed", help="Random seed used in torch and numpy", type=int, default=None)
     parser.add_argument("-g", "--gpu", type=str, default="")
+    parser.add_argument("--quantize", action='store_true', help='dynamic int8 quantization for CPU inference')
+    parser.add_argument("--group_size", type=int, default=1, help='number of models evaluated together in one pass over the data')
+    parser.add_argument("--threads", type=int, default=0, help='threads running the models of a group (0: run them in turn)')
 
     '''
     ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -37,7 +37,7 @@ def train_monitor_collection(logging_frequency):
     mc.track_monitor = best_inv_fpr
     return mc
 
-def test_monitor_collection():
+def test_monitor_collection(quantize=False):
     roc_auc = ROCAUC(visualizing=True)
     inv_fpr = InvFPR(visualizing=True)
     best_inv_fpr = Best(inv_fpr)
@@ -49,6 +49,12 @@ def test_monitor_collection():
         Regurgitate('valid_loss', visualizing=True),
         Regurgitate('model', visualizing=False, numerical=False)
         ]
+    if quantize:
+        monitors += [
+            Regurgitate('roc_auc_delta', ndp=5),
+            Regurgitate('inv_fpr_delta'),
+            Regurgitate('latency_delta'),
+        ]
     mc = MonitorCollection(*monitors)
 
     return mc
@@ -48,7 +48,7 @@ def get_admin_kwargs(args):
         verbose=args.verbose,
         cmd_line_args=args.cmd_line_args,
         root_dir=args.root_dir,
-        monitor_collection=train_monitor_collection(args.lf),
+        monitor_collection=train_monitor_collection(args.lf, fp32=args.bf16 and args.fp32_every > 0),
         arg_string=args.arg_string,
         epochs=args.epochs
     )
@@ -89,6 +89,9 @@ def get_training_kwargs(args):
         time_limit = args.experiment_time * 60 * 60 - 60,
         epochs = args.epochs,
         clip = args.clip,
+        autocast = args.bf16,
+        fp32_every = args.fp32_every,
+        micro_batch = args.micro_batch,
 
     )
 
@@ -118,9 +121,11 @@ def get_model_kwargs(args):
         'mp_layer':args.mp,
         'symmetric':not args.asym,
         'readout':args.readout,
+        'readout_steps':args.readout_steps,
         'matrix':args.adj[0] if len(args.adj) == 1 else args.adj,
         'm_act':args.m_act,
         'wn': args.wn,
+        'checkpoint': args.checkpoint,
 
         # Stacked NMP
         'scales': args.scales,
@@ -141,7 +146,11 @@ def get_model_kwargs(args):
         'n_layers':args.n_layers,
         'dq':args.dq,
         'dv':args.dv,
-        'dropout':args.model_dropout,
+        # --model_dropout is a keep probability, like --data_dropout
+        'dropout':1 - args.model_dropout,
+
+        # Induced set transformer
+        'n_inducing':args.n_inducing,
 
 
         'debug':args.debug
@@ -52,6 +52,7 @@ def main(sysargvlist=None):
     #training = parser.add_argument_group('training')
     parser.add_argument("-e", "--epochs", type=int, default=32)
     parser.add_argument("-b", "--batch_size", type=int, default=64)
+    parser.add_argument("--micro_batch", type=int, default=None, help='split each batch into micro-batches of this many examples and accumulate their gradients')
     parser.add_argument("--experiment_time", type=int, default=1000000)
 
     '''
@@ -77,6 +78,9 @@ def main(sysargvlist=None):
     #computing = parser.add_argument_group('computing')
     parser.add_argument("--seed", help="Random seed used in torch and numpy", type=int, default=None)
     parser.add_argument("-g", "--gpu", type=str, default="")
+    parser.add_argument("--bf16", action='store_true', help='bfloat16 autocast for training and validation')
+    parser.add_argument("--fp32_every", type=int, default=0, help='with --bf16, also validate in float32 every this many epochs (0 never)')
+    parser.add_argument("--ensemble", type=int, default=1, help='train this many independently initialised copies of the model together')
 
     '''
     ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -107,7 +111,7 @@ def main(sysargvlist=None):
     parser.add_argument("--predict", type=str, default='simple', help='type of prediction layer')
 
     # Transform
-    parser.add_argument("-m", "--model", type=str, default="nmp", help="name of the model you want to train")
+    parser.add_argument("-m", "--model", type=str, default="nmp", help="name of the model you want to train (nmp, tf, ist)")
 
     # NMP
     parser.add_argument("-i", "--iters", type=int, default=10)
@@ -118,8 +122,10 @@ def main(sysargvlist=None):
     parser.add_argument("-a","--adj", type=str, nargs='+', default='dm', help='type of matrix layer')
     parser.add_argument("--asym", action='store_true', default=False)
     parser.add_argument("--readout", type=str, default='dtnn', help='type of readout layer')
+    parser.add_argument("--readout_steps", type=int, default=3, help='processing steps of the set readout (models saved without it run one step per padded node)')
     parser.add_argument("--m_act", type=str, default='sigmoid', help='type of nonlinearity for matrices' )
     parser.add_argument("--wn", action='store_true')
+    parser.add_argument("--checkpoint", type=int, default=0, help='checkpoint every k message passing layers (0: off)')
 
     # Stack NMP
     parser.add_argument("--pool_first", action='store_true', default=False)
@@ -140,6 +146,9 @@ def main(sysargvlist=None):
     parser.add_argument("--dq", type=int, default=32)
     parser.add_argument("--dv", type=int, default=32)
 
+    # Induced set transformer
+    parser.add_argument("--n_inducing", type=int, default=16, help='number of inducing points')
+
     if sysargvlist is None:
         args = parser.parse_args()
     else:
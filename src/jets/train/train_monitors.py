@@ -1,7 +1,9 @@
+import numpy as np
+
 from src.monitors import *
 from src.admin.MonitorCollection import MonitorCollection
 
-def train_monitor_collection(logging_frequency):
+def train_monitor_collection(logging_frequency, fp32=False):
     roc_auc = ROCAUC(visualizing=True, ndp=5)
     inv_fpr = InvFPR(visualizing=True)
     best_inv_fpr = Best(inv_fpr)
@@ -16,10 +18,18 @@ def train_monitor_collection(logging_frequency):
         Regurgitate('train_loss', ndp=3,visualizing=True)
 
     ]
+    if fp32:
+        metric_monitors += [
+            Regurgitate('valid_loss_fp32', default=np.nan, ndp=3,visualizing=True),
+            Regurgitate('roc_auc_fp32', default=np.nan, ndp=5,visualizing=True),
+        ]
     time_monitors = [
         Regurgitate('epoch', visualizing=False, printing=False),
         Regurgitate('iteration', visualizing=False, printing=False),
         Hours(),
+        Regurgitate('throughput', ndp=1, visualizing=True),
+        Regurgitate('oom_splits', ndp=0, visualizing=True),
+        Regurgitate('valid_oom_splits', ndp=0, visualizing=False),
     ]
     optim_monitors = [
         Collect('lr', fn='last', ndp=8,visualizing=True),
@@ -4,24 +4,49 @@ import time
 import torch
 
 from src.data_ops.wrapping import unwrap
+from src.data_ops.precision import autocast as autocast_context
+from src.data_ops.micro_batches import chunk_batch
+from src.utils.ensemble import member_losses, clip_grad_norm
 from src.admin.utils import log_gpu_usage
 
 from ..loss import loss
 
-def train_one_batch(model, batch, optimizer, administrator, epoch, batch_number, clip):
+def split_batch(x, y, size):
+    '''
+    Micro-batches of at most size jets. Each comes with its share of the
+    batch, the weight of its (mean) loss in the loss of the whole batch.
+    The micro-batches keep the padded length of the batch: the readouts
+    average over padded nodes, so trimming would change the outputs.
+    '''
+    if not isinstance(x, tuple):
+        raise ValueError("Micro-batching needs padded leaves, not batched trees")
+    (data, mask) = x
+    for indices in chunk_batch(mask, size):
+        yield (data[indices], mask[indices]), y[indices], len(indices) / len(y)
+
+def train_one_batch(model, batch, optimizer, administrator, epoch, batch_number, clip, autocast=False, micro_batch=None):
     logger = administrator.logger
     (x, y) = batch
 
-    # forward
     model.train()
     optimizer.zero_grad()
-    y_pred = model(x, logger=logger, epoch=epoch, iters=batch_number)
-    l = loss(y_pred, y)
+    if micro_batch is None:
+        chunks = [(x, y, 1.)]
+    else:
+        chunks = split_batch(x, y, micro_batch)
+
+    # forward and backward, accumulating the gradients of the micro-batches
+    l = torch.zeros(())
+    for x_chunk, y_chunk, weight in chunks:
+        with autocast_context(enabled=autocast):
+            y_pred = model(x_chunk, logger=logger, epoch=epoch, iters=batch_number)
+            l_chunk = member_losses(loss, model, y_pred, y_chunk) * weight
+        l_chunk.sum().backward()
+        l = l + l_chunk.detach()
+        del y_pred
 
-    # backward
-    l.backward()
     if clip is not None:
-        torch.nn.utils.clip_grad_norm(model.parameters(), clip)
+        clip_grad_norm(model, clip)
 
     #if batch_number == 0:
     #    old_params = torch.cat([p.view(-1) for p in model.parameters()], 0)
@@ -46,4 +71,5 @@ def train_one_batch(model, batch, optimizer, administrator, epoch, batch_number,
     #del y; del y_pred; del x; del batch
 
 
-    return float(unwrap(l))
+    # one loss per member when training an ensemble
+    return float(unwrap(l)) if l.dim() == 0 else unwrap(l)
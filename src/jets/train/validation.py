@@ -1,35 +1,83 @@
 import logging
 import time
 
+import numpy as np
+
 from src.data_ops.wrapping import unwrap
+from src.utils.oom import is_oom, free_memory
+from src.data_ops.precision import autocast as autocast_context
+from src.monitors import ROCAUC
 from ..loss import loss
 
-def validation(model, data_loader):
+def evaluate_batch(model, x, y, autocast=False):
+    '''
+    (loss, predictions, number of splits) of model on a batch. A batch that
+    runs out of memory is evaluated in two halves, recursively.
+    '''
+    try:
+        with autocast_context(enabled=autocast):
+            y_pred = model(x)
+            vl = loss(y_pred, y)
+        return float(unwrap(vl)), unwrap(y_pred.float()), 0
+    except RuntimeError as e:
+        if not is_oom(e) or len(y) == 1 or not isinstance(x, tuple):
+            raise
+    free_memory()
+    (data, mask) = x
+    halves = [slice(None, len(y) // 2), slice(len(y) // 2, None)]
+    results = [evaluate_batch(model, (data[h], mask[h]), y[h], autocast) for h in halves]
+    vl = sum(r[0] * len(y[h]) for r, h in zip(results, halves)) / len(y)
+    return vl, np.concatenate([r[1] for r in results]), 1 + sum(r[2] for r in results)
+
+def validate_models(models, data_loader, autocast=False, executor=None):
+    '''
+    Evaluate several models in a single pass over data_loader: each batch is
+    collated once and fed to every model. Returns one logdict per model, the
+    same as validation would. With an executor (e.g. a ThreadPoolExecutor)
+    the models run concurrently on each batch.
+    '''
     t_valid = time.time()
-    model.eval()
+    for model in models:
+        model.eval()
 
-    valid_loss = 0.
-    yy, yy_pred = [], []
+    valid_losses = [0. for _ in models]
+    n_splits = [0 for _ in models]
+    yy, yy_preds = [], [[] for _ in models]
     for i, (x, y) in enumerate(data_loader):
-        y_pred = model(x)
-        vl = loss(y_pred, y); valid_loss += float(unwrap(vl))
-        yv = unwrap(y); y_pred = unwrap(y_pred)
-        yy.append(yv); yy_pred.append(y_pred)
-
-    valid_loss /= len(data_loader)
-
-    t1=time.time()
-
-    logdict = dict(
-        yy=yy,
-        yy_pred=yy_pred,
-        #mask=mask,
-        w_valid=data_loader.dataset.weights,
-        valid_loss=valid_loss,
-        model=model,
-        logtime=0,
+        if executor is None:
+            results = [evaluate_batch(model, x, y, autocast) for model in models]
+        else:
+            results = list(executor.map(lambda model: evaluate_batch(model, x, y, autocast), models))
+        yy.append(unwrap(y))
+        for j, (vl, y_pred, splits) in enumerate(results):
+            valid_losses[j] += vl
+            yy_preds[j].append(y_pred)
+            n_splits[j] += splits
+
+    logdicts = []
+    for model, valid_loss, yy_pred, splits in zip(models, valid_losses, yy_preds, n_splits):
+        logdict = dict(
+            yy=yy,
+            yy_pred=yy_pred,
+            #mask=mask,
+            w_valid=data_loader.dataset.weights,
+            valid_loss=valid_loss / len(data_loader),
+            valid_oom_splits=splits,
+            model=model,
+            logtime=0,
+        )
+        logdicts.append(logdict)
+        model.train()
+
+    logging.info("Validation of {} model(s) took {:.1f} seconds".format(len(models), time.time() - t_valid))
+    return logdicts
+
+def validation(model, data_loader, autocast=False):
+    return validate_models([model], data_loader, autocast=autocast)[0]
+
+def fp32_summary(logdict):
+    '''The loss and ROC AUC of a float32 validation, to compare a bfloat16 run against'''
+    return dict(
+        valid_loss_fp32=logdict['valid_loss'],
+        roc_auc_fp32=float(ROCAUC()(**logdict)),
     )
-    #logdict.update(train_dict)
-    model.train()
-    logging.info("Validation took {:.1f} seconds".format(time.time() - t_valid))
-    return logdict
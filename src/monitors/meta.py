@@ -55,12 +55,20 @@ class LogOnImprovement(ScalarMonitor):
         return self.value
 
 class Regurgitate(ScalarMonitor):
-    def __init__(self, value_name, **kwargs):
+    '''
+    Logs value_name as given in the logdict. With a default, a logdict
+    without value_name (e.g. an epoch that skipped computing it) logs default.
+    '''
+    def __init__(self, value_name, default=None, **kwargs):
         self.value_name = value_name
+        self.default = default
         super().__init__(value_name, **kwargs)
 
     def call(self, **kwargs):
-        v = kwargs[self.value_name]
+        if self.default is not None:
+            v = kwargs.get(self.value_name, self.default)
+        else:
+            v = kwargs[self.value_name]
         if self.numerical:
             v = ensure_numpy_float(v)
         self.value = v
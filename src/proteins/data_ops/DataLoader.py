@@ -19,34 +19,43 @@ def pad_matrices(matrix_list):
         padded_data[i, :len_x, :len_x] = x
     return padded_data
 
+def pad_contacts(contact_list):
+    '''
+    Given a list of int8 contact maps, return a tensor whose i'th element is
+    the i'th map, padded right and bottom with -1 (unknown).
+    '''
+    max_seq_length = max(len(c) for c in contact_list)
+    padded_data = torch.full((len(contact_list), max_seq_length, max_seq_length), -1, dtype=torch.int8)
+    for i, c in enumerate(contact_list):
+        len_c = len(c)
+        padded_data[i, :len_c, :len_c] = torch.from_numpy(c)
+    return padded_data
+
 def collate(data_tuples):
-    x, batch_mask = preprocess_x([x for x, _, _ in data_tuples])
-    y = preprocess_y([y for _, y, _ in data_tuples])
-    y_mask = preprocess_mask([mask for _, _, mask in data_tuples])
+    x, batch_mask = preprocess_x([x for x, _ in data_tuples])
+    y, y_mask = preprocess_contacts([c for _, c in data_tuples])
     return x, y, y_mask, batch_mask
 
-def preprocess_mask(mask_list):
-    mask = [torch.from_numpy(mask) for mask in mask_list]
-    mask = pad_matrices(mask)
-    mask = wrap(mask)
-    return mask
-
-def preprocess_y(y_list):
-    y_list = [torch.from_numpy(y) for y in y_list]
-    y = pad_matrices(y_list)
-    y = wrap(y)
-    return y
+def preprocess_contacts(contact_list):
+    contacts = pad_contacts(contact_list)
+    y = wrap((contacts == 1).float())
+    y_mask = wrap((contacts >= 0).float())
+    return y, y_mask
 
 def preprocess_x(x_list):
-    data = [torch.from_numpy(x) for x in x_list]
+    # [token id, acc, ss3] per residue: the models expand the ids themselves
+    data = [torch.cat([torch.from_numpy(s).float().unsqueeze(1), torch.from_numpy(a), torch.from_numpy(t)], 1) for s, a, t in x_list]
     data, mask = pad_tensors_extra_channel(data)
     data = wrap(data)
     mask = wrap(mask)
     return data, mask
 
 class DataLoader(_DL):
-    def __init__(self, dataset, batch_size):
-        super().__init__(dataset, batch_size, collate_fn=collate)
+    def __init__(self, dataset, batch_size, batch_sampler=None):
+        if batch_sampler is None:
+            super().__init__(dataset, batch_size, collate_fn=collate)
+        else:
+            super().__init__(dataset, batch_sampler=batch_sampler, collate_fn=collate)
 
     @property
     def dim(self):
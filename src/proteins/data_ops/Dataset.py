@@ -2,6 +2,7 @@ from torch.utils.data import Dataset as D
 import numpy as np
 
 from .Protein import Protein
+from .tokens import N_TOKENS
 from src.admin.utils import format_bytes
 
 class Dataset(D):
@@ -10,13 +11,17 @@ class Dataset(D):
         if crop:
             proteins = self.crop(proteins)
 
-        self.X = [np.concatenate([p.sequence, p.acc, p.ss3], 1) for p in proteins]
-        self.Y = [p.contact_matrix * p.mask for p in proteins]
-        self.masks = [p.mask for p in proteins]
+        # uint8 token ids, expanded to one-hot vectors in the models
+        self.sequences = [p.sequence for p in proteins]
+        self.acc = [np.asarray(p.acc, dtype='float32') for p in proteins]
+        self.ss3 = [np.asarray(p.ss3, dtype='float32') for p in proteins]
+        # int8 contact maps with the unknown entries as -1: the dense targets
+        # and their mask are only built at collate time
+        self.contacts = [p.contact_matrix for p in proteins]
 
 
     def __len__(self):
-        return len(self.X)
+        return len(self.sequences)
 
     def crop(self, proteins):
         #max_len = 859 # 99th percentile
@@ -27,23 +32,21 @@ class Dataset(D):
         return proteins
 
     def __getitem__(self, idx):
-        x = self.X[idx]
-        y = self.Y[idx]
-        mask = self.masks[idx]
-        return x, y, mask
+        return (self.sequences[idx], self.acc[idx], self.ss3[idx]), self.contacts[idx]
 
     def shuffle(self):
-        perm = np.random.permutation(len(self.X))
-        self.X = [self.X[i] for i in perm]
-        self.Y = [self.Y[i] for i in perm]
-        self.masks = [self.masks[i] for i in perm]
+        perm = np.random.permutation(len(self.sequences))
+        self.sequences = [self.sequences[i] for i in perm]
+        self.acc = [self.acc[i] for i in perm]
+        self.ss3 = [self.ss3[i] for i in perm]
+        self.contacts = [self.contacts[i] for i in perm]
 
     @property
     def max_length(self):
         try:
             return self._max_length
         except AttributeError:
-            self._max_length = max(len(p) for p in self.X)
+            self._max_length = max(len(p) for p in self.sequences)
             return self._max_length
 
     @property
@@ -51,27 +54,36 @@ class Dataset(D):
         try:
             return self._mean_length
         except AttributeError:
-            self._mean_length = np.mean(list(len(p) for p in self.X))
+            self._mean_length = np.mean(list(len(p) for p in self.sequences))
             return self._mean_length
 
+    @property
+    def lengths(self):
+        return [len(s) for s in self.sequences]
+
     @property
     def dim(self):
         try:
             return self._dim
         except AttributeError:
-            self._dim = self.X[0].shape[-1]
+            # one-hot residues, acc and ss3, as the models see them
+            self._dim = N_TOKENS + self.acc[0].shape[-1] + self.ss3[0].shape[-1]
             return self._dim
 
     @property
     def bytes(self):
-        bytes_per_elt = 4
-        mask_size = sum([np.prod(m.shape) * bytes_per_elt for m in self.masks])
-        y_size = sum([np.prod(m.shape) * bytes_per_elt for m in self.Y])
-        x_size = sum([np.prod(m.shape) * bytes_per_elt for m in self.X])
-        b = mask_size + y_size + x_size
+        contacts_size = sum(c.nbytes for c in self.contacts)
+        x_size = sum(s.nbytes + a.nbytes + t.nbytes for s, a, t in zip(self.sequences, self.acc, self.ss3))
+        b = contacts_size + x_size
         return format_bytes(b)
 
     @classmethod
     def from_records(cls, records):
         proteins = [Protein.from_record(record) for record in records]
         return cls(proteins)
+
+    @classmethod
+    def from_store(cls, store, n=-1):
+        '''The first n proteins of a ProteinStore (all if n is -1), left memory-mapped'''
+        n = len(store) if n < 0 else min(n, len(store))
+        return cls([store[i] for i in range(n)])
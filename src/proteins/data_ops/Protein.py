@@ -1,19 +1,15 @@
-import string
 import numpy as np
 
+from .tokens import tokenize
+
 def unknown_mask(contact_matrix):
     x, y = np.where(contact_matrix == -1)
     mask = np.ones_like(contact_matrix)
     mask[x,y] = 0
     return mask
 
-def _string_vectorizer(strng, alphabet=string.ascii_uppercase):
-    vector = [[0 if char != letter else 1 for char in alphabet]
-                  for letter in strng]
-    return vector
-
 def process_sequence_string(seq):
-    return np.array(_string_vectorizer(seq))[:, :20]
+    return tokenize(seq)
 
 class Protein:
     def __init__(
@@ -24,7 +20,8 @@ class Protein:
             ss3=None
             ):
         self.sequence=process_sequence_string(sequence)
-        self.contact_matrix=contact_matrix.astype('float32')
+        # 1 contact, 0 no contact, -1 unknown
+        self.contact_matrix=contact_matrix.astype('int8')
         self.acc=acc
         self.ss3=ss3
 
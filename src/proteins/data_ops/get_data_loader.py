@@ -1,30 +1,39 @@
 import os
-import pickle
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
+from src.data_ops.samplers import TokenBudgetBatchSampler
 from .DataLoader import DataLoader
 from .Dataset import Dataset
+from .store import ProteinStore
 
 def load_dataset(filename, n):
-    with open(filename, 'rb') as f:
-        data = pickle.load(f, encoding='latin-1')
-    logging.info("Loaded {} examples from {}".format(len(data),filename))
+    # the pickle is converted into a memory-mapped store on first use, so
+    # only the first n proteins are ever read from it
+    store = ProteinStore.from_pickle(filename)
+    logging.info("Loaded {} examples from {}".format(len(store), store.store_dir))
+    dataset = Dataset.from_store(store, n)
     if n > -1:
-        data = data[:n]
-        logging.info("Using {}".format(len(data)))
-    dataset = Dataset.from_records(data)
+        logging.info("Using {}".format(len(dataset)))
     logging.info("Dataset size: {}".format(dataset.bytes))
-    del data
     return dataset
 
-def get_data_loader(filename, n, batch_size):
+def get_data_loader(filename, n, batch_size, token_budget=None, shuffle=False):
     dataset = load_dataset(filename, n)
-    data_loader = DataLoader(dataset, batch_size)
+    if token_budget is None:
+        batch_sampler = None
+    else:
+        # batches of up to token_budget padded contact map entries
+        batch_sampler = TokenBudgetBatchSampler(dataset.lengths, token_budget, shuffle=shuffle)
+        logging.info("{} batches under a budget of {} tokens".format(len(batch_sampler), token_budget))
+    data_loader = DataLoader(dataset, batch_size, batch_sampler=batch_sampler)
     return data_loader
 
-def get_train_data_loader(data_dir, n_train, n_valid, batch_size, **kwargs):
-    train_data_loader = get_data_loader(os.path.join(data_dir, 'train.pkl'), n_train, batch_size)
-    valid_data_loader = get_data_loader(os.path.join(data_dir, 'valid.pkl'), n_valid, batch_size)
+def get_train_data_loader(data_dir, n_train, n_valid, batch_size, token_budget=None, **kwargs):
+    with ThreadPoolExecutor(2) as executor:
+        train_future = executor.submit(get_data_loader, os.path.join(data_dir, 'train.pkl'), n_train, batch_size, token_budget, shuffle=True)
+        valid_future = executor.submit(get_data_loader, os.path.join(data_dir, 'valid.pkl'), n_valid, batch_size, token_budget)
+        train_data_loader, valid_data_loader = train_future.result(), valid_future.result()
     return train_data_loader, valid_data_loader
 
 def get_test_data_loader(data_dir, n_test, batch_size, **kwargs):
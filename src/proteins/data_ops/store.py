@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+from .Protein import Protein
+
+ARRAYS = ['sequence', 'acc', 'ss3', 'contacts', 'offsets', 'contact_offsets']
+
+def store_dirname(filename):
+    '''The store built from a pickle of records, e.g. train.pkl -> train_store'''
+    return os.path.splitext(filename)[0] + '_store'
+
+def source_fingerprint(filename):
+    '''The size and modification time of the pickle a store is built from'''
+    stat = os.stat(filename)
+    return dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+def stored_fingerprint(store_dir):
+    '''The source fingerprint recorded in a store, or None if it has none'''
+    try:
+        with open(os.path.join(store_dir, 'source.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def build_store(filename, store_dir):
+    '''
+    Convert the pickled protein records in filename into a store: flat .npy
+    arrays in store_dir holding every protein's sequence tokens (uint8), acc
+    and ss3 (float32) and contact map (int8, flattened), with the offsets of
+    each protein into them, and the fingerprint of filename in source.json.
+    The store is written to a temporary directory and moved into place when
+    complete, replacing a stale store there.
+    '''
+    t = time.time()
+    fingerprint = source_fingerprint(filename)
+    with open(filename, 'rb') as f:
+        records = pickle.load(f, encoding='latin-1')
+
+    first = Protein.from_record(records[0])
+    lengths = np.array([len(record['sequence']) for record in records], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    contact_offsets = np.concatenate([[0], np.cumsum(lengths ** 2)])
+
+    tmp_dir = store_dir + '.tmp{}'.format(os.getpid())
+    os.makedirs(tmp_dir)
+    def open_array(name, shape, dtype):
+        return np.lib.format.open_memmap(os.path.join(tmp_dir, name + '.npy'), mode='w+', dtype=dtype, shape=shape)
+
+    sequence = open_array('sequence', (offsets[-1],), np.uint8)
+    acc = open_array('acc', (offsets[-1],) + np.shape(first.acc)[1:], np.float32)
+    ss3 = open_array('ss3', (offsets[-1],) + np.shape(first.ss3)[1:], np.float32)
+    contacts = open_array('contacts', (contact_offsets[-1],), np.int8)
+    for i, record in enumerate(records):
+        p = Protein.from_record(record)
+        a, b = offsets[i], offsets[i + 1]
+        sequence[a:b] = p.sequence
+        acc[a:b] = p.acc
+        ss3[a:b] = p.ss3
+        contacts[contact_offsets[i]:contact_offsets[i + 1]] = p.contact_matrix.reshape(-1)
+    for array in [sequence, acc, ss3, contacts]:
+        array.flush()
+    del sequence, acc, ss3, contacts
+    np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+    np.save(os.path.join(tmp_dir, 'contact_offsets.npy'), contact_offsets)
+    with open(os.path.join(tmp_dir, 'source.json'), 'w') as f:
+        json.dump(fingerprint, f)
+
+    stale_dir = None
+    if os.path.isdir(store_dir) and stored_fingerprint(store_dir) != fingerprint:
+        stale_dir = store_dir + '.stale{}'.format(os.getpid())
+        try:
+            os.rename(store_dir, stale_dir)
+        except OSError:
+            # moved aside concurrently by another process
+            stale_dir = None
+    try:
+        os.rename(tmp_dir, store_dir)
+    except OSError:
+        # built concurrently by another process
+        shutil.rmtree(tmp_dir)
+    if stale_dir is not None:
+        shutil.rmtree(stale_dir)
+    logging.info("Built the store {} from {} records in {:.1f} seconds".format(store_dir, len(records), time.time() - t))
+
+class StoredProtein:
+    '''A protein of a ProteinStore: views into its memory-mapped arrays'''
+    def __init__(self, sequence, acc, ss3, contact_matrix):
+        self.sequence = sequence
+        self.acc = acc
+        self.ss3 = ss3
+        self.contact_matrix = contact_matrix
+
+    def __len__(self):
+        return len(self.sequence)
+
+class ProteinStore:
+    '''
+    Random access to the proteins of a store built by build_store. The
+    arrays are memory-mapped (copy-on-write), so a protein is only read from
+    disk when its data is used.
+    '''
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(store_dir, name + '.npy'), mmap_mode='c'))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if not 0 <= idx < len(self):
+            raise IndexError("Protein {} out of range for a store of {}".format(idx, len(self)))
+        a, b = self.offsets[idx], self.offsets[idx + 1]
+        c, d = self.contact_offsets[idx], self.contact_offsets[idx + 1]
+        return StoredProtein(
+            sequence=self.sequence[a:b],
+            acc=self.acc[a:b],
+            ss3=self.ss3[a:b],
+            contact_matrix=self.contacts[c:d].reshape(b - a, b - a),
+        )
+
+    @classmethod
+    def from_pickle(cls, filename):
+        '''
+        The store of a pickle of records, built on first use and rebuilt when
+        the pickle's size or modification time no longer match the store's
+        '''
+        store_dir = store_dirname(filename)
+        if not os.path.isdir(store_dir):
+            logging.info("No store for {}: building one".format(filename))
+            build_store(filename, store_dir)
+        elif stored_fingerprint(store_dir) != source_fingerprint(filename):
+            logging.info("The store of {} is out of date: rebuilding it".format(filename))
+            build_store(filename, store_dir)
+        return cls(store_dir)
@@ -0,0 +1,25 @@
+import string
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# residues A to T are tokens 0 to 19, anything else is token 20
+N_TOKENS = 20
+TOKEN_TABLE = np.full(256, N_TOKENS, dtype=np.uint8)
+for i, letter in enumerate(string.ascii_uppercase[:N_TOKENS]):
+    TOKEN_TABLE[ord(letter)] = i
+
+def tokenize(seq):
+    '''uint8 token ids of a sequence string'''
+    return TOKEN_TABLE[np.frombuffer(seq.encode('latin-1'), dtype=np.uint8)]
+
+def expand_tokens(x):
+    '''
+    Given a collated batch x (B, N, 1 + F + 1) whose first channel is the
+    token ids and last channel the padding flag, return (B, N, 20 + F + 1)
+    with the ids one-hot encoded. Token 20 and the padded rows are all zero.
+    '''
+    one_hot = F.one_hot(x[:, :, 0].long(), N_TOKENS + 1)[:, :, :N_TOKENS].to(x.dtype)
+    one_hot = one_hot * (1 - x[:, :, -1:])
+    return torch.cat([one_hot, x[:, :, 1:]], 2)
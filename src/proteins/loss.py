@@ -4,15 +4,18 @@ from torch.autograd import Variable
 import numpy as np
 
 from src.data_ops.wrapping import wrap
+from src.data_ops.constant_cache import band_distances
+from src.data_ops.precision import full_precision
 from src.admin.utils import see_tensors_in_memory
 
+@full_precision
 def loss(y_pred, y, y_mask, bm):
     l = nll
     return l(y_pred, y, y_mask, bm)
 
 def kl(y_pred, y, y_mask):
     n = y_pred.shape[1]
-    dists = wrap(torch.Tensor(distances(n)) ** (1/2.5)).view(-1, n, n)
+    dists = band_distances(n, power=1/2.5, device=y_pred.device).view(-1, n, n)
 
     logprobs = stable_log(y_pred)
 
@@ -30,7 +33,7 @@ def nll(y_pred, y, y_mask, batch_mask):
     n_ = batch_mask.sum(1,keepdim=True)[:,:,0]
 
     #x = F.sigmoid(distances(n) - n / 2)
-    dists = wrap(torch.Tensor(distances(n))).view(-1, n, n) * batch_mask
+    dists = band_distances(n, device=y_pred.device).view(-1, n, n) * batch_mask
     x = torch.exp(-(n_.unsqueeze(1) - dists - 1)*0.01)
     #import ipdb; ipdb.set_trace()
 
@@ -47,7 +50,7 @@ def nll(y_pred, y, y_mask, batch_mask):
 
 def cho_loss(y_pred, y, y_mask):
     n = y_pred.shape[1]
-    dists = wrap(torch.Tensor(distances(n)) ** (1./2.5))
+    dists = band_distances(n, power=1./2.5, device=y_pred.device).view(-1, n ** 2)
 
     y_pred = y_pred.view(-1, n ** 2)
     y = y.view(-1, n ** 2)
@@ -92,11 +95,9 @@ def distances(n):
     b_dists = abs(rows - columns)
     return b_dists
 
+@full_precision
 def stable_log(x):
-    minvar = Variable(torch.Tensor([1e-20]))
-    if torch.cuda.is_available():
-        minvar = minvar.cuda()
-    x = torch.log(torch.max(x, minvar))
+    x = torch.log(x.clamp(min=1e-20))
 
     return x
 
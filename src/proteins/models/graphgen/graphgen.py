@@ -3,16 +3,16 @@ import logging
 from collections import OrderedDict
 
 import numpy as np
-
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.nn.parameter import Parameter
-from torch.autograd import Variable
 
 from src.data_ops.wrapping import wrap
+from src.proteins.data_ops.tokens import expand_tokens
 
 from src.architectures.nmp.message_passing.vertex_update import GRUUpdate
+from src.architectures.utils import run_layers
 
 from src.admin.utils import memory_snapshot
 #from src.misc.grad_mode import no_grad
@@ -52,6 +52,31 @@ class BasicBlock(nn.Module):
 
         return out
 
+class SquaredDistance(torch.autograd.Function):
+    '''
+    ||x_j - y_k||^2 as ||x_j||^2 + ||y_k||^2 - 2 <x_j, y_k>, clamped at zero.
+    Only x and y are saved for the backward pass, which uses the exact gradients
+    d/dx_j = 2 sum_k g_jk (x_j - y_k) and d/dy_k = 2 sum_j g_jk (y_k - x_j),
+    so no (bs, n, m, d) tensor is formed in either direction.
+    '''
+    @staticmethod
+    def forward(ctx, x, y):
+        ctx.save_for_backward(x, y)
+        x_norm = x.pow(2).sum(2, keepdim=True)
+        y_norm = x_norm if y is x else y.pow(2).sum(2, keepdim=True)
+        dist = torch.baddbmm(x_norm + y_norm.transpose(1, 2), x, y.transpose(1, 2), alpha=-2)
+        return dist.clamp_(min=0)
+
+    @staticmethod
+    def backward(ctx, grad):
+        x, y = ctx.saved_tensors
+        grad_x = grad_y = None
+        if ctx.needs_input_grad[0]:
+            grad_x = 2 * (grad.sum(2, keepdim=True) * x - torch.bmm(grad, y))
+        if ctx.needs_input_grad[1]:
+            grad_y = 2 * (grad.sum(1).unsqueeze(2) * y - torch.bmm(grad.transpose(1, 2), x))
+        return grad_x, grad_y
+
 def squared_distance_matrix(x, y):
     '''
     Calculate the pairwise squared distances between two batches of matrices x and y.
@@ -64,18 +89,10 @@ def squared_distance_matrix(x, y):
     bs = x.size(0)
     assert bs == y.size(0)
 
-    n = x.size(1)
-    m = y.size(1)
-
     d = x.size(2)
     assert d == y.size(2)
 
-    x = x.unsqueeze(2).expand(bs, n, m, d)
-    y = y.unsqueeze(1).expand(bs, n, m, d)
-
-    dist = torch.pow(x - y, 2).sum(3)
-
-    return dist
+    return SquaredDistance.apply(x, y)
 
 class ConvolutionalNMPBlock(nn.Module):
     def __init__(self, dim):
@@ -133,6 +150,25 @@ class ConvolutionOnlyBlock(nn.Module):
         x = self.conv1d(x.transpose(1,2)).transpose(1,2)
         return x
 
+def truncation_depths(n_layers, truncate=0, no_grad=False, training=True):
+    '''
+    (n_front, n_back): the first n_front layers (and the embedding before
+    them) run without gradient, and the next n_back are differentiated.
+
+    With truncate = k these are the first n_layers - k and the last k layers.
+    With no_grad, in training, a random number n in [0, n_layers) of layers
+    run without gradient and are followed by a single differentiated layer,
+    or by none if n = 0: the depth varies from batch to batch, and the
+    embedding is differentiated on the batches with n = 0.
+    '''
+    if no_grad and training:
+        n = np.random.randint(0, n_layers)
+        return n, min(n, 1)
+    if truncate:
+        n_front = max(n_layers - truncate, 0)
+        return n_front, n_layers - n_front
+    return 0, n_layers
+
 class GraphGen(nn.Module):
     def __init__(self,
         features=None,
@@ -141,12 +177,28 @@ class GraphGen(nn.Module):
         no_grad=False,
         tied=False,
         block=None,
+        checkpoint=0,
+        truncate=0,
         **kwargs
         ):
+        '''
+        With truncate = k > 0, only the last k blocks are differentiated: the
+        embedding and the blocks before them run without gradient, and their
+        output is detached. With no_grad, the depth is random in training
+        (see truncation_depths).
+        '''
 
         super().__init__()
 
+        if no_grad and truncate:
+            raise ValueError("no_grad and truncate = {} are exclusive".format(truncate))
+        if 0 < truncate < iters:
+            logging.warning('truncate = {} < iters = {}: the initial embedding will not be trained'.format(truncate, iters))
+            if not tied:
+                logging.warning('truncate set but tied = False: the first {} blocks will not be trained'.format(iters - truncate))
         self.no_grad = no_grad
+        self.truncate = truncate
+        self.checkpoint = checkpoint
         self.initial_embedding = nn.Linear(features, hidden)
 
         if block == 'cnmp':
@@ -171,40 +223,18 @@ class GraphGen(nn.Module):
         self.scale = wrap(torch.zeros(1))
 
     def forward(self, x, mask=None, **kwargs):
+        x = expand_tokens(x)
+        n_front, n_back = truncation_depths(len(self.nmp_blocks), self.truncate, self.no_grad, self.training)
 
-        if self.no_grad:
-            A = self.forward_no_grad(x, mask, **kwargs)
-        else:
-            A = self.forward_with_grad(x, mask, **kwargs)
-
-        return A
-
-    def forward_with_grad(self, x, mask, **kwargs):
-        x = self.initial_embedding(x)
-
-        for nmp in self.nmp_blocks:
-            x = nmp(x, mask)
-
-        s = self.final_spatial_embedding(x)
-        A = torch.exp( - squared_distance_matrix(s,s) * torch.exp(self.scale)) * mask
-        return A
-
-
-    def forward_no_grad(self, x, mask, **kwargs):
-        n_volatile_layers = np.random.randint(0, len(self.nmp_blocks))
-
-        if n_volatile_layers > 0:
-            x = Variable(x.data, volatile=True)
-            x = self.initial_embedding(x)
-            for i in range(n_volatile_layers):
-                nmp = self.nmp_blocks[i]
-                x = nmp(x, mask)
-            x = Variable(x.data)
-            x = self.nmp_blocks[n_volatile_layers](x, mask)
+        if n_front > 0:
+            with torch.no_grad():
+                x = run_layers(self.nmp_blocks[:n_front], self.initial_embedding(x), mask)
+            x = x.detach()
         else:
             x = self.initial_embedding(x)
 
+        x = run_layers(self.nmp_blocks[n_front:n_front + n_back], x, mask, every=self.checkpoint)
+
         s = self.final_spatial_embedding(x)
         A = torch.exp( - squared_distance_matrix(s,s) * torch.exp(self.scale)) * mask
-
         return A
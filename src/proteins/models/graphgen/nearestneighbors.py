@@ -10,6 +10,9 @@ from torch.nn.parameter import Parameter
 from torch.autograd import Variable
 
 from src.data_ops.wrapping import wrap
+from .graphgen import truncation_depths
+from src.proteins.data_ops.tokens import expand_tokens
+from src.data_ops.constant_cache import entry_distance_matrix, spatial_grid, batched
 
 from src.architectures.nmp.message_passing import MP_LAYERS
 from src.architectures.nmp.adjacency import construct_adjacency
@@ -27,12 +30,6 @@ from src.monitors import BatchMatrixMonitor
 from src.admin.utils import memory_snapshot
 #from src.misc.grad_mode import no_grad
 
-def entry_distance_matrix(n):
-    A = torch.triu(torch.ones(n, n), 0)
-    A = torch.mm(A, A)
-    A = A + torch.triu(A,1).transpose(0,1)
-    return A
-
 def upper_to_lower_diagonal_ones(n):
     A = torch.eye(n)
     A_ = torch.eye(n-1)
@@ -52,13 +49,8 @@ def position_encoding_init(n_position, d_pos_vec):
     position_enc[1:, 1::2] = np.cos(position_enc[1:, 1::2]) # dim 2i+1
     return torch.from_numpy(position_enc).type(torch.FloatTensor)
 
-def spatial_variable(bs, n_vertices):
-    s = Variable(torch.stack([torch.arange(n_vertices), torch.zeros(n_vertices), torch.zeros(n_vertices)], 1).unsqueeze(0).repeat(bs, 1, 1))
-    s = s - s.mean(1, keepdim=True)
-    s = s / s.size(1)
-    if torch.cuda.is_available():
-        s = s.cuda()
-    return s
+def spatial_variable(bs, n_vertices, device=None):
+    return batched(spatial_grid(n_vertices, device=device), bs)
 
 
 def dense_topk():
@@ -78,15 +70,27 @@ class NearestNeighbors(nn.Module):
         mp_layer=None,
         no_grad=False,
         tied=False,
+        truncate=0,
         **kwargs
         ):
+        '''
+        With truncate = k > 0, only the last k message passing steps are
+        differentiated: the embeddings and the steps before them run without
+        gradient, and their output is detached. With no_grad, the depth is
+        random in training (see truncation_depths).
+        '''
 
         super().__init__()
 
         self.iters = iters
+        if no_grad and truncate:
+            raise ValueError("no_grad and truncate = {} are exclusive".format(truncate))
+        if 0 < truncate < iters:
+            logging.warning('truncate = {} < iters = {}: the embeddings will not be trained'.format(truncate, iters))
         self.no_grad = no_grad
-        if no_grad and not tied:
-            logging.warning('no_grad set to True but tied = False. Setting tied = True')
+        self.truncate = truncate
+        if truncate and not tied:
+            logging.warning('truncate set but tied = False. Setting tied = True')
             tied = True
 
         emb_kwargs = {x: kwargs[x] for x in ['act', 'wn']}
@@ -111,65 +115,30 @@ class NearestNeighbors(nn.Module):
         self.pos_embedding.weight = Parameter(pos_enc_weight)
 
     def forward(self, x, mask=None, **kwargs):
-
-        if self.no_grad:
-            A = self.forward_no_grad(x, mask, **kwargs)
-        else:
-            A = self.forward_with_grad(x, mask, **kwargs)
-
-        return A
-
-    def forward_with_grad(self, x, mask, **kwargs):
-        bs = x.size()[0]
-        n_vertices = x.size()[1]
-
-        h = Variable(x.data, volatile=False)
-        s = spatial_variable(bs, n_vertices)
-        h = self.content_embedding(h)
-        s = self.positional_update(s, h)
-        A = self.adj(s, mask, **kwargs)
-
-        for i, mp in enumerate(self.mp_layers):
-            h = mp(h, A)
-            s = self.positional_update(s, h)
-            A = self.adj(s, mask, **kwargs)
-
-        return A
-
-    def forward_no_grad(self, x, mask, **kwargs):
+        x = expand_tokens(x)
         bs, n_vertices, _ = x.size()
-        n_volatile_layers = np.random.randint(0, self.iters)
+        n_front, n_back = truncation_depths(self.iters, self.truncate, self.no_grad, self.training)
 
-        if n_volatile_layers == 0:
-            h = Variable(x.data, volatile=False)
-            s = spatial_variable(bs, n_vertices)
-            h = self.content_embedding(h)
+        with torch.set_grad_enabled(torch.is_grad_enabled() and n_front == 0):
+            s = spatial_variable(bs, n_vertices, device=x.device)
+            h = self.content_embedding(x)
             s = self.positional_update(s, h)
             A = self.adj(s, mask, **kwargs)
-            return A
-
-        h = Variable(x.data, volatile=True)
-        s = spatial_variable(bs, n_vertices)
-        h = self.content_embedding(h)
-        s = self.positional_update(s, h)
-        A = self.adj(s, mask, **kwargs)
+            for mp in self.mp_layers[:n_front]:
+                h, s, A = self.step(mp, h, s, A, mask, **kwargs)
+        if n_front > 0:
+            h, s, A = h.detach(), s.detach(), A.detach()
 
-        for i in range(n_volatile_layers):
-            mp = self.mp_layers[i]
-            h = mp(h, A)
-            s = self.positional_update(s, h)
-            A = self.adj(s, mask, **kwargs)
+        for mp in self.mp_layers[n_front:n_front + n_back]:
+            h, s, A = self.step(mp, h, s, A, mask, **kwargs)
 
-        h = Variable(h.data)
-        s = Variable(s.data)
-        A = Variable(A.data)
+        return A
 
-        mp = self.mp_layers[n_volatile_layers]
+    def step(self, mp, h, s, A, mask, **kwargs):
         h = mp(h, A)
         s = self.positional_update(s, h)
         A = self.adj(s, mask, **kwargs)
-
-        return A
+        return h, s, A
 
     def encode_position(self, bs, n):
 
@@ -5,6 +5,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from src.data_ops.wrapping import wrap
+from src.proteins.data_ops.tokens import expand_tokens
 
 from src.architectures.nmp.message_passing import MP_LAYERS
 from src.architectures.nmp.adjacency import construct_adjacency
@@ -18,15 +19,46 @@ from src.monitors import Histogram
 from src.monitors import Collect
 from src.monitors import BatchMatrixMonitor
 
-
-def sparse_topk(matrix, k):
-    n = matrix.size()[0]
-    matrix_sorted, indices = torch.sort(matrix, descending=True)
-    topk_indices, _  = torch.sort(indices[:,:k])
-    sparse_indices = torch.LongTensor([[i, x] for i in range(n) for x in topk_indices[i] ]).t()
-    sparse_data = matrix[sparse_indices[0], sparse_indices[1]]
-    sparse_matrix = torch.sparse.FloatTensor(sparse_indices, sparse_data, matrix.size())
-    return sparse_matrix
+from src.admin.utils import time_call
+
+
+class TopKAdjacency:
+    '''
+    Row-wise top-k sparsification of a batch of matrices, stored as the kept
+    values and their column indices, both of shape (bs, n, k).
+    matmul(x) gives torch.matmul(A_dense, x) by gathering the k neighbours of
+    each vertex, without forming the n * n matrix.
+    '''
+    def __init__(self, values, indices, n_columns):
+        self.values = values
+        self.indices = indices
+        self.n_columns = n_columns
+
+    def matmul(self, x):
+        bs, n, k = self.indices.size()
+        d = x.size(2)
+        index = self.indices.view(bs, n * k, 1).expand(bs, n * k, d)
+        neighbours = torch.gather(x, 1, index).view(bs * n, k, d)
+        return torch.bmm(self.values.view(bs * n, 1, k), neighbours).view(bs, n, d)
+
+    def to_dense(self):
+        bs, n, k = self.indices.size()
+        return self.values.new_zeros(bs, n, self.n_columns).scatter(2, self.indices, self.values)
+
+
+def sparse_topk(matrix, k, mask=None):
+    '''
+    Keep the k largest entries in each row of matrix (bs, n, m).
+    Entries where mask is zero are never kept; rows with fewer than k valid
+    entries are padded with zero values.
+    '''
+    k = min(k, matrix.size(2))
+    if mask is not None:
+        matrix = matrix.masked_fill(mask == 0, float('-inf'))
+    values, indices = torch.topk(matrix, k, dim=2)
+    if mask is not None:
+        values = values.masked_fill(values == float('-inf'), 0)
+    return TopKAdjacency(values, indices, matrix.size(2))
 
 
 def sparse(dense):
@@ -36,14 +68,22 @@ def sparse(dense):
 
 
 def time_sparse_topk(reps, bs, n, k, d):
-    import time
-    t = time.time()
-    for i in range(reps):
-        S = torch.round(torch.rand(bs,n,n) * 100 - 50)
-        sp = [sparse_topk(m, k) for m in S]
-
-    t = (time.time() - t) / reps
-    print("{:.1f}".format(t))
+    '''
+    Milliseconds per call of the top-k construction, the sparse product A . x
+    and the dense product it replaces, on random (bs, n, d) inputs.
+    '''
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    h = torch.randn(bs, n, d, device=device)
+    S = torch.bmm(h, h.transpose(1,2))
+    A = sparse_topk(S, k)
+
+    timings = [
+        ('topk', lambda: sparse_topk(S, k)),
+        ('sparse matmul', lambda: A.matmul(h)),
+        ('dense matmul', lambda: torch.bmm(S, h)),
+    ]
+    for name, fn in timings:
+        print("{:<16}{:.2f} ms".format(name, 1000 * time_call(fn, reps=reps)))
 
 class SparseGraphGen(nn.Module):
     def __init__(self,
@@ -64,7 +104,8 @@ class SparseGraphGen(nn.Module):
         self.embedding = EMBEDDINGS['n'](dim_in=features, dim_out=hidden, n_layers=int(emb_init), **emb_kwargs)
 
         mp_kwargs = {x: kwargs[x] for x in ['act', 'wn', 'update', 'message', 'matrix', 'matrix_activation']}
-        MPLayer = MP_LAYERS['m1']
+        # the top-k adjacency is never made dense inside the loop
+        MPLayer = MP_LAYERS['m1i']
         self.mp_layers = nn.ModuleList([MPLayer(hidden=hidden,**mp_kwargs) for _ in range(iters)])
 
         self.adj = NegativeSquare(temperature=0.001,symmetric=False, act='exp', logger=kwargs['logger'], logging_frequency=kwargs['logging_frequency'])
@@ -72,19 +113,12 @@ class SparseGraphGen(nn.Module):
         self.k = 50
 
     def forward(self, x, mask=None, **kwargs):
-        bs = x.size()[0]
-        n_vertices = x.size()[1]
-
-        h = self.embedding(x)
-        for i, mp in enumerate(self.mp_layers):
+        h = self.embedding(expand_tokens(x))
+        for mp in self.mp_layers:
             S = torch.bmm(h, h.transpose(1,2))
-            sparse_adjacency = [sparse_topk(s, self.k) for s in S]
-
-            #A = self.adj(h, mask, **kwargs)
-            for i, (ex, A) in enumerate(zip(h, sparse_adjacency)):
-                h[i] = mp(ex.unsqueeze(0), A.unsqueeze(0))
+            h = mp(h, sparse_topk(S, self.k, mask))
 
         S = torch.bmm(h, h.transpose(1,2))
-        A = torch.stack([sparse_topk(s, self.k).to_dense() for s in S],0)
+        A = sparse_topk(S, self.k, mask).to_dense()
         #A = torch.exp( - self.euclidean(h) / temperature ) * mask
         return A
@@ -6,6 +6,8 @@ from collections import OrderedDict
 import math
 
 from src.admin.utils import memory_snapshot
+from src.data_ops.constant_cache import cached_constant
+from src.architectures.utils import run_layers
 
 def conv_and_pad3x3(in_planes, out_planes, kernel_size=3,stride=1):
     # "3x3 convolution with padding"
@@ -13,6 +15,47 @@ def conv_and_pad3x3(in_planes, out_planes, kernel_size=3,stride=1):
     return nn.Conv2d(in_planes, out_planes, kernel_size=kernel_size, stride=stride, padding=padding, bias=False)
 
 
+def padding_support(n, kernel_size):
+    '''
+    V[i, d] = 1 if tap d of a zero padded, size preserving convolution centred
+    at i lands inside 0, ..., n-1
+    '''
+    padding = (kernel_size - 1) // 2
+    taps = torch.arange(n).unsqueeze(1) + torch.arange(kernel_size).unsqueeze(0) - padding
+    return ((taps >= 0) & (taps < n)).float()
+
+
+class PairwiseConv2d(nn.Conv2d):
+    '''
+    Same parameters and output as a size preserving Conv2d(2 * in_planes, out_planes)
+    applied to the outer concatenation cat([x_l, x_r], 1) of 1d features x (B, C, L),
+    x_l[..., i, j] = x[..., j] and x_r[..., i, j] = x[..., i].
+
+    The x_l half only varies along j, so its contribution is a 1d convolution
+    along j for each kernel row, summed over the rows that fall inside the
+    padded border; likewise for x_r along i. The two are broadcast added and
+    the (B, 2C, L, L) input is never formed.
+    '''
+    def __init__(self, in_planes, out_planes, kernel_size=7):
+        padding = (kernel_size - 1) // 2
+        super().__init__(2 * in_planes, out_planes, kernel_size=kernel_size, stride=1, padding=padding, bias=False)
+
+    def forward(self, x):
+        bs, in_planes, n = x.size()
+        out_planes, _, k, _ = self.weight.size()
+        w_l, w_r = self.weight[:, :in_planes], self.weight[:, in_planes:]
+
+        # rows[b, o, di, j] = sum_{c, dj} w_l[o, c, di, dj] x[b, c, j + dj - p]
+        rows = F.conv1d(x, w_l.permute(0, 2, 1, 3).reshape(out_planes * k, in_planes, k), padding=self.padding[0])
+        # cols[b, o, dj, i] = sum_{c, di} w_r[o, c, di, dj] x[b, c, i + di - p]
+        cols = F.conv1d(x, w_r.permute(0, 3, 1, 2).reshape(out_planes * k, in_planes, k), padding=self.padding[0])
+
+        support = cached_constant('padding_support_{}'.format(k), (n,), lambda n: padding_support(n, k), dtype=x.dtype, device=x.device)
+        out = torch.matmul(support, rows.view(bs, out_planes, k, n))
+        out.add_(torch.matmul(support, cols.view(bs, out_planes, k, n)).transpose(2, 3))
+        return out
+
+
 class BasicBlock(nn.Module):
     expansion = 1
     def __init__(self, inplanes, planes, stride=1, downsample=None):
@@ -73,12 +116,21 @@ class Bottleneck(nn.Module):
 
 
 class ResNet2d(nn.Module):
-    def __init__(self, block, layers, features=None, hidden=None, **kwargs):
+    def __init__(self, block, layers, features=None, hidden=None, pairwise=False, checkpoint=0, **kwargs):
+        '''
+        With pairwise set, the input is the 1d features (B, features, L) and the
+        first layer acts on their outer concatenation without forming it.
+        With checkpoint = k > 0 the residual blocks are checkpointed k at a time.
+        '''
         self.inplanes = hidden
+        self.checkpoint = checkpoint
         super().__init__()
 
         m = OrderedDict()
-        m['conv1'] = nn.Conv2d(features, hidden, kernel_size=7, stride=1, padding=3, bias=False)
+        if pairwise:
+            m['conv1'] = PairwiseConv2d(features, hidden, kernel_size=7)
+        else:
+            m['conv1'] = nn.Conv2d(features, hidden, kernel_size=7, stride=1, padding=3, bias=False)
         m['bn1'] = nn.BatchNorm2d(hidden)
         m['relu1'] = nn.ReLU(inplace=True)
         #m['maxpool'] = nn.MaxPool2d(kernel_size=3, stride=2, padding=1)
@@ -118,7 +170,7 @@ class ResNet2d(nn.Module):
 
     def forward(self, x):
         x = self.group1(x)
-        x = self.transform(x)
+        x = run_layers(self.transform, x, every=self.checkpoint)
         x = F.sigmoid(torch.mean(x, 1))
 
 
@@ -1,4 +1,4 @@
 from .train_one_batch import train_one_batch
-from .validation import validation
+from .validation import validation, validate_models, fp32_summary
 from .train_monitors import train_monitor_collection
 from .train_argument_converter import train_argument_converter
@@ -46,7 +46,7 @@ def get_admin_kwargs(args):
         verbose=args.verbose,
         cmd_line_args=args.cmd_line_args,
         root_dir=args.root_dir,
-        monitor_collection=train_monitor_collection(args.lf),
+        monitor_collection=train_monitor_collection(args.lf, fp32=args.bf16 and args.fp32_every > 0),
         arg_string=args.arg_string,
         epochs=args.epochs
     )
@@ -61,7 +61,8 @@ def get_data_loader_kwargs(args):
         data_dir=data_dir,
         n_train=args.n_train,
         n_valid=args.n_valid,
-        batch_size=args.batch_size
+        batch_size=args.batch_size,
+        token_budget=args.token_budget,
     )
 
 def get_optim_args(args):
@@ -85,6 +86,9 @@ def get_training_kwargs(args):
         time_limit = args.experiment_time * 60 * 60 - 60,
         epochs = args.epochs,
         clip = args.clip,
+        autocast = args.bf16,
+        fp32_every = args.fp32_every,
+        micro_batch = args.micro_batch,
 
     )
 
@@ -102,7 +106,9 @@ def get_model_kwargs(args):
         'emb_init':args.emb_init,
         'wn': args.wn,
         'no_grad': args.no_grad,
+        'truncate': args.truncate,
         'tied': args.tied,
+        'checkpoint': args.checkpoint,
 
         'debug':args.debug,
     }
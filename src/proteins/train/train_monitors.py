@@ -1,7 +1,9 @@
+import numpy as np
+
 from src.monitors import *
 from src.admin.MonitorCollection import MonitorCollection
 
-def train_monitor_collection(logging_frequency):
+def train_monitor_collection(logging_frequency, fp32=False):
     valid_loss = Regurgitate('valid_loss', ndp=3,visualizing=True)
     best_valid_loss = Best(valid_loss, track='min',ndp=3)
     metric_monitors = [
@@ -11,12 +13,21 @@ def train_monitor_collection(logging_frequency):
         Regurgitate('train_loss', ndp=3,visualizing=True)
 
     ]
+    if fp32:
+        metric_monitors += [
+            Regurgitate('valid_loss_fp32', default=np.nan, ndp=3,visualizing=True),
+            Regurgitate('acc_L_5_fp32', default=np.nan, ndp=3,visualizing=True),
+            Regurgitate('acc_long_L_5_fp32', default=np.nan, ndp=3,visualizing=True),
+        ]
 
     time_monitors = [
         Regurgitate('epoch', visualizing=False,printing=False),
         Regurgitate('iteration', visualizing=False, printing=False),
         Hours(),
         Collect('time', fn='sum', visualizing=False, printing=False),
+        Regurgitate('throughput', ndp=1, visualizing=True),
+        Regurgitate('oom_splits', ndp=0, visualizing=True),
+        Regurgitate('valid_oom_splits', ndp=0, visualizing=False),
 
     ]
 
@@ -4,25 +4,50 @@ import torch
 
 from src.admin.utils import see_tensors_in_memory, log_gpu_usage
 from src.data_ops.wrapping import unwrap
+from src.data_ops.precision import autocast as autocast_context
+from src.data_ops.micro_batches import chunk_batch
+from src.utils.ensemble import member_losses, clip_grad_norm
 
 from ..loss import loss
 
-def train_one_batch(model, batch, optimizer, administrator, epoch, batch_number, clip):
+def split_batch(batch, size):
+    '''
+    Micro-batches of at most size proteins. Each comes with the weight of its
+    (mean) loss in the loss of the whole batch: its share of the contacts
+    selected by y_mask. The micro-batches keep the padded length of the
+    batch, since the loss counts padded entries as negatives (reweight_loss).
+    '''
+    (x, y, y_mask, batch_mask) = batch
+    n_contacts = max(float(y_mask.sum()), 1.)
+    for indices in chunk_batch(batch_mask, size):
+        chunk = (x[indices], y[indices], y_mask[indices], batch_mask[indices])
+        weight = float(chunk[2].sum()) / n_contacts
+        if weight > 0:
+            yield chunk, weight
+
+def train_one_batch(model, batch, optimizer, administrator, epoch, batch_number, clip, autocast=False, micro_batch=None):
     logger = administrator.logger
     (x, y, y_mask, batch_mask) = batch
 
-    # forward
     model.train()
     optimizer.zero_grad()
-    y_pred = model(x, mask=batch_mask, logger=logger, epoch=epoch, iters=batch_number)
-
-    l = loss(y_pred, y, y_mask, batch_mask)
-
-    # backward
-    l.backward()
+    if micro_batch is None:
+        chunks = [(batch, 1.)]
+    else:
+        chunks = split_batch(batch, micro_batch)
+
+    # forward and backward, accumulating the gradients of the micro-batches
+    l = torch.zeros(())
+    for (x_chunk, y_chunk, y_mask_chunk, batch_mask_chunk), weight in chunks:
+        with autocast_context(enabled=autocast):
+            y_pred = model(x_chunk, mask=batch_mask_chunk, logger=logger, epoch=epoch, iters=batch_number)
+            l_chunk = member_losses(loss, model, y_pred, y_chunk, y_mask_chunk, batch_mask_chunk) * weight
+        l_chunk.sum().backward()
+        l = l + l_chunk.detach()
+        del y_pred
 
     if clip is not None:
-        torch.nn.utils.clip_grad_norm(model.parameters(), clip)
+        clip_grad_norm(model, clip)
 
     #if False:
     #if batch_number == 0:
@@ -49,8 +74,9 @@ def train_one_batch(model, batch, optimizer, administrator, epoch, batch_number,
     #else:
     #    model_params = None
 
-    del y; del y_pred; del y_mask; del x; del batch_mask; del batch
+    del y; del y_mask; del x; del batch_mask; del batch
 
     log_gpu_usage()
 
-    return float(unwrap(l))
+    # one loss per member when training an ensemble
+    return float(unwrap(l)) if l.dim() == 0 else unwrap(l)
@@ -51,6 +51,8 @@ def main(sysargvlist=None):
     #training = parser.add_argument_group('training')
     parser.add_argument("-e", "--epochs", type=int, default=32)
     parser.add_argument("-b", "--batch_size", type=int, default=64)
+    parser.add_argument("--token_budget", type=int, default=None, help='batch proteins under this budget of batch size x (longest length)^2, instead of batch_size')
+    parser.add_argument("--micro_batch", type=int, default=None, help='split each batch into micro-batches of this many examples and accumulate their gradients')
     parser.add_argument("--experiment_time", type=int, default=1000000)
 
     '''
@@ -76,6 +78,9 @@ def main(sysargvlist=None):
     #computing = parser.add_argument_group('computing')
     parser.add_argument("--seed", help="Random seed used in torch and numpy", type=int, default=None)
     parser.add_argument("-g", "--gpu", type=str, default="")
+    parser.add_argument("--bf16", action='store_true', help='bfloat16 autocast for training and validation')
+    parser.add_argument("--fp32_every", type=int, default=0, help='with --bf16, also validate in float32 every this many epochs (0 never)')
+    parser.add_argument("--ensemble", type=int, default=1, help='train this many independently initialised copies of the model together')
 
     '''
     ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -116,8 +121,10 @@ def main(sysargvlist=None):
     parser.add_argument("--message", type=str, default='2', help='type of message')
     parser.add_argument("--emb_init", type=str, default='1', help='type of message')
     parser.add_argument("--wn", action='store_true')
-    parser.add_argument("--no_grad", action='store_true')
+    parser.add_argument("--no_grad", action='store_true', help='train at a random depth, differentiating only the last layer')
+    parser.add_argument("--truncate", type=int, default=0, help='only backpropagate through the last k blocks (0: off)')
     parser.add_argument("--tied", action='store_true')
+    parser.add_argument("--checkpoint", type=int, default=0, help='checkpoint every k blocks (0: off)')
 
 
     if sysargvlist is None:
@@ -3,7 +3,12 @@ import time
 
 import torch
 
+import numpy as np
+
 from src.data_ops.wrapping import unwrap
+from src.utils.oom import is_oom, free_memory
+from src.data_ops.precision import autocast as autocast_context
+from src.monitors.protein_metrics import compute_protein_metrics
 from ..loss import loss
 
 
@@ -12,48 +17,107 @@ def half_and_half(a,b):
     b = torch.stack([torch.tril(x, diagonal=-1) for x in b], 0)
     return a + b
 
-def validation(model, data_loader):
-    t_valid = time.time()
-    model.eval()
+def evaluate_batch(model, batch, autocast=False):
+    '''
+    (loss, predictions, half and half, hard predictions, number of splits)
+    of model on a batch. A batch that runs out of memory is evaluated in two
+    halves, recursively.
+    '''
+    (x, y, y_mask, batch_mask) = batch
+    try:
+        with autocast_context(enabled=autocast):
+            y_pred = model(x, mask=batch_mask)
+            vl = loss(y_pred, y, y_mask, batch_mask)
+        y_pred = y_pred.float()
 
-    valid_loss = 0.
-    yy, yy_pred = [], []
-    half = []
-    mask = []
-    hard_pred = []
-    for i, batch in enumerate(data_loader):
-        (x, y, y_mask, batch_mask) = batch
-        y_pred = model(x, mask=batch_mask)
+        out = (
+            float(unwrap(vl)),
+            unwrap(y_pred),
+            unwrap(half_and_half(y, y_pred)),
+            unwrap(half_and_half(y, (y_pred > 0.5).float())),
+            0,
+        )
+        del y_pred; del vl
+        return out
+    except RuntimeError as e:
+        if not is_oom(e) or len(y) == 1:
+            raise
+    free_memory()
+    halves = [slice(None, len(y) // 2), slice(len(y) // 2, None)]
+    results = [evaluate_batch(model, tuple(t[h] for t in batch), autocast) for h in halves]
+    # the loss is a mean over the contacts selected by y_mask
+    n_contacts = [float(y_mask[h].sum()) for h in halves]
+    vl = sum(r[0] * n for r, n in zip(results, n_contacts)) / max(sum(n_contacts), 1.)
+    arrays = tuple(np.concatenate([r[i] for r in results]) for i in (1, 2, 3))
+    return (vl,) + arrays + (1 + sum(r[4] for r in results),)
 
-        vl = loss(y_pred, y, y_mask, batch_mask)
+def validate_models(models, data_loader, autocast=False, executor=None):
+    '''
+    Evaluate several models in a single pass over data_loader: each batch is
+    collated once and fed to every model. Returns one logdict per model, the
+    same as validation would. With an executor (e.g. a ThreadPoolExecutor)
+    the models run concurrently on each batch.
+    '''
+    t_valid = time.time()
+    for model in models:
+        model.eval()
 
-        valid_loss = valid_loss + float(unwrap(vl))
+    valid_losses = [0. for _ in models]
+    n_splits = [0 for _ in models]
+    yy, mask = [], []
+    yy_preds = [[] for _ in models]
+    halves = [[] for _ in models]
+    hard_preds = [[] for _ in models]
+    for i, batch in enumerate(data_loader):
+        if executor is None:
+            results = [evaluate_batch(model, batch, autocast) for model in models]
+        else:
+            results = list(executor.map(lambda model: evaluate_batch(model, batch, autocast), models))
 
+        (x, y, y_mask, batch_mask) = batch
         yy.append(unwrap(y))
-        yy_pred.append(unwrap(y_pred))
         mask.append(unwrap(batch_mask))
+        for j, (vl, y_pred, half, hard_pred, splits) in enumerate(results):
+            valid_losses[j] = valid_losses[j] + vl
+            n_splits[j] += splits
+            yy_preds[j].append(y_pred)
+            halves[j].append(half)
+            hard_preds[j].append(hard_pred)
 
-        half.append(unwrap(half_and_half(y, y_pred)))
-        hard_pred.append(unwrap(half_and_half(y, (y_pred > 0.5).float())))
+        del y; del y_mask; del x; del batch_mask; del batch
 
-        del y; del y_pred; del y_mask; del x; del batch_mask; del batch
+    #grads = torch.cat([p.grad.view(-1) for p in model.parameters() if p.grad is not None], 0)
 
-    valid_loss /= len(data_loader)
+    logdicts = []
+    for j, model in enumerate(models):
+        logdict = dict(
+            yy=yy,
+            yy_pred=yy_preds[j],
+            half=halves[j],
+            hard_pred=hard_preds[j],
+            mask=mask,
+            valid_loss=valid_losses[j] / len(data_loader),
+            valid_oom_splits=n_splits[j],
+            model=model,
+            #grads=grads,
+        )
+        logdicts.append(logdict)
+        model.train()
 
-    #grads = torch.cat([p.grad.view(-1) for p in model.parameters() if p.grad is not None], 0)
+    logging.info("Validation of {} model(s) took {:.1f} seconds".format(len(models), time.time() - t_valid))
+    return logdicts
 
-    logdict = dict(
-        yy=yy,
-        yy_pred=yy_pred,
-        half=half,
-        hard_pred=hard_pred,
-        mask=mask,
-        valid_loss=valid_loss,
-        model=model,
-        #grads=grads,
-    )
-    model.train()
+def validation(model, data_loader, autocast=False):
+    return validate_models([model], data_loader, autocast=autocast)[0]
 
-    t1=time.time()
-    logging.info("Validation took {:.1f} seconds".format(time.time() - t_valid))
-    return logdict
+def fp32_summary(logdict):
+    '''
+    The loss and top L/5 contact precision (all and long range) of a float32
+    validation, to compare a bfloat16 run against
+    '''
+    metrics = compute_protein_metrics(logdict['yy'], logdict['yy_pred'], [5])
+    return dict(
+        valid_loss_fp32=logdict['valid_loss'],
+        acc_L_5_fp32=metrics['acc_L_5'],
+        acc_long_L_5_fp32=metrics['acc_long_L_5'],
+    )
@@ -0,0 +1,134 @@
+'''
+Memory/time tradeoff table for activation checkpointing and truncated
+backpropagation.
+
+    python benchmark_memory.py [-c 0 1 2] [-t 0 1 2] [--reps 5] [--configs nmp wangnet] [-o table.txt]
+
+For each configuration, checkpointing interval and truncation depth (GraphGen
+only), one training step
+(forward + backward of the summed output) is timed on random inputs, and the
+activation memory is reported: the bytes autograd keeps for the backward pass
+and, on a GPU, the peak allocated memory of the step. With --output, the
+table is also written to that file, headed by the device it was measured on.
+'''
+if __name__ == '__main__':
+    import matplotlib as mpl
+    mpl.use('Agg')
+import sys
+sys.path.append('../..')
+import argparse
+
+import torch
+
+from src.admin.utils import saved_tensors_bytes, time_call, peak_cuda_memory, format_bytes
+from src.jets.models import MODEL_DICT as JETS_MODEL_DICT
+from src.proteins.models import MODEL_DICT as PROTEINS_MODEL_DICT
+from src.proteins.data_ops.tokens import N_TOKENS
+
+JETS_KWARGS = dict(features=8, emb_init='1', readout='dtnn', matrix='dm', m_act='soft', symmetric=True,
+                   act='leakyrelu', wn=False, update='gru', message='2')
+PROTEINS_KWARGS = dict(features=27, act='leakyrelu', wn=False)
+
+CONFIGS = [
+    # name, problem, model class, model kwargs, batch size, number of nodes
+    ('nmp-h64-i10', 'j', JETS_MODEL_DICT['nmp'], dict(JETS_KWARGS, hidden=64, iters=10), 100, 120),
+    ('nmp-h128-i20', 'j', JETS_MODEL_DICT['nmp'], dict(JETS_KWARGS, hidden=128, iters=20), 100, 120),
+    ('graphgen-cnmp-h64-i10', 'p', PROTEINS_MODEL_DICT['g'], dict(PROTEINS_KWARGS, hidden=64, iters=10, block='cnmp'), 4, 400),
+    ('graphgen-cnmp-h64-i10-tied', 'p', PROTEINS_MODEL_DICT['g'], dict(PROTEINS_KWARGS, hidden=64, iters=10, block='cnmp', tied=True), 4, 400),
+    ('wangnet-h32-i8', 'p', PROTEINS_MODEL_DICT['w'], dict(PROTEINS_KWARGS, hidden=32, iters=8), 2, 300),
+]
+TRUNCATABLE = {PROTEINS_MODEL_DICT['g']}
+
+def random_inputs(problem, features, bs, n):
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    mask = torch.ones(bs, n, n, device=device)
+    if problem == 'j':
+        x = torch.randn(bs, n, features, device=device)
+        return ((x, mask),)
+    # token ids, the other features, no padding
+    tokens = torch.randint(0, N_TOKENS + 1, (bs, n, 1), device=device).float()
+    x = torch.randn(bs, n, features - N_TOKENS - 1, device=device)
+    x = torch.cat([tokens, x, torch.zeros(bs, n, 1, device=device)], 2)
+    return (x, mask)
+
+def training_step(model, inputs):
+    def step():
+        model.zero_grad()
+        model(*inputs).sum().backward()
+    return step
+
+def measure(ModelClass, problem, model_kwargs, bs, n, reps):
+    torch.manual_seed(1)
+    model = ModelClass(**model_kwargs)
+    if torch.cuda.is_available():
+        model.cuda()
+    inputs = random_inputs(problem, model_kwargs['features'], bs, n)
+
+    with saved_tensors_bytes() as saved:
+        out = model(*inputs)
+    out.sum().backward()
+    del out
+
+    step = training_step(model, inputs)
+    peak = peak_cuda_memory(step)
+    seconds = time_call(step, reps=reps)
+    return saved.bytes, peak, seconds
+
+def gradients(ModelClass, problem, model_kwargs, bs, n):
+    torch.manual_seed(1)
+    model = ModelClass(**model_kwargs)
+    if torch.cuda.is_available():
+        model.cuda()
+    torch.manual_seed(2)
+    inputs = random_inputs(problem, model_kwargs['features'], bs, n)
+    model.zero_grad()
+    model(*inputs).sum().backward()
+    return torch.cat([
+        p.grad.view(-1) if p.grad is not None else torch.zeros_like(p).view(-1)
+        for p in model.parameters()
+    ])
+
+def gradient_agreement(ModelClass, problem, model_kwargs, bs, n):
+    '''
+    Cosine similarity between the gradient of a truncated model and that of
+    the same model (same weights and batch) differentiated through every
+    layer: how well truncation preserves the training signal.
+    '''
+    full = gradients(ModelClass, problem, dict(model_kwargs, truncate=0), bs, n)
+    truncated = gradients(ModelClass, problem, model_kwargs, bs, n)
+    return float(torch.nn.functional.cosine_similarity(full, truncated, dim=0))
+
+def main(sysargvlist=None):
+    parser = argparse.ArgumentParser(description='Activation checkpointing benchmark')
+    parser.add_argument("-c", "--checkpoint", type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument("-t", "--truncate", type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument("--reps", type=int, default=5)
+    parser.add_argument("--configs", type=str, nargs='+', default=None, help='only run configs whose name contains one of these')
+    parser.add_argument("-o", "--output", type=str, default=None, help='also write the table to this file')
+    args = parser.parse_args(sysargvlist)
+
+    device = torch.cuda.get_device_name() if torch.cuda.is_available() else 'cpu'
+    header = '{:<30}{:>6}{:>6}{:>14}{:>14}{:>12}{:>10}'.format('config', 'k', 't', 'saved', 'peak', 'ms/step', 'grad cos')
+    lines = ['# torch {} on {}'.format(torch.__version__, device), header, '-' * len(header)]
+    for line in lines:
+        print(line)
+    for name, problem, ModelClass, model_kwargs, bs, n in CONFIGS:
+        if args.configs is not None and not any(c in name for c in args.configs):
+            continue
+        truncations = args.truncate if ModelClass in TRUNCATABLE else [0]
+        for t in truncations:
+            for k in args.checkpoint:
+                kwargs = dict(model_kwargs, checkpoint=k, truncate=t)
+                saved, peak, seconds = measure(ModelClass, problem, kwargs, bs, n, args.reps)
+                agreement = gradient_agreement(ModelClass, problem, kwargs, bs, n) if t > 0 else 1.
+                line = '{:<30}{:>6}{:>6}{:>14}{:>14}{:>12.1f}{:>10.3f}'.format(
+                    name, k, t, format_bytes(saved), format_bytes(peak) if peak is not None else '-', 1000 * seconds, agreement)
+                print(line)
+                lines.append(line)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,12 @@
+if __name__ == '__main__':
+    import matplotlib as mpl
+    mpl.use('Agg')
+import sys
+sys.path.append('../..')
+if __name__ == "__main__":
+    problem=sys.argv[1]
+    if problem == 'j':
+        from src.jets.serve.serve_jets import main
+    else:
+        raise NotImplementedError("Scoring servers only implemented for jets")
+    main(sys.argv[2:])
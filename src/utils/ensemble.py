@@ -0,0 +1,94 @@
+import copy
+
+import torch
+import torch.nn as nn
+from torch.nn.modules.batchnorm import _BatchNorm
+from torch.func import stack_module_state, functional_call, vmap
+
+def _key(name):
+    return name.replace('.', '__')
+
+class Ensemble(nn.Module):
+    '''
+    K independently initialised copies of one architecture, trained as a
+    single module. Their parameters are stacked along a new leading dimension
+    and the forward pass vmaps the architecture over it, so one call runs
+    every member on the same batch and returns outputs of shape (K, ...).
+
+    The optimizers of this repo (Adam, SGD) are elementwise, so a single
+    optimizer over the stacked parameters keeps a separate state per member.
+    Gradients are clipped per member with clip_grad_norm_.
+
+    Batch norm updates its running statistics in place, which vmap cannot
+    do over stacked buffers, so models with batch norm cannot be ensembled.
+    '''
+    def __init__(self, models):
+        super().__init__()
+        if len(models) < 2:
+            raise ValueError("An ensemble needs at least 2 members, got {}".format(len(models)))
+        batch_norms = [name for name, m in models[0].named_modules() if isinstance(m, _BatchNorm)]
+        if len(batch_norms) > 0:
+            raise ValueError("Models with batch norm cannot be ensembled ({} has {} batch norm layers, e.g. {}): train the members separately".format(
+                type(models[0]).__name__, len(batch_norms), batch_norms[0]))
+        params, buffers = stack_module_state(models)
+        self.param_names = list(params.keys())
+        self.buffer_names = list(buffers.keys())
+        for name, p in params.items():
+            self.register_parameter(_key(name), nn.Parameter(p.detach()))
+        for name, b in buffers.items():
+            self.register_buffer(_key(name), b)
+
+        # the architecture the members share; kept out of the module tree so
+        # that its own parameters are neither trained nor saved
+        self.__dict__['template'] = copy.deepcopy(models[0])
+        self.n_members = len(models)
+
+    def stacked(self):
+        params = {name: getattr(self, _key(name)) for name in self.param_names}
+        buffers = {name: getattr(self, _key(name)) for name in self.buffer_names}
+        return params, buffers
+
+    def forward(self, *args, **kwargs):
+        def member(params, buffers, *args):
+            return functional_call(self.template, (params, buffers), args, kwargs)
+        in_dims = (0, 0) + (None,) * len(args)
+        params, buffers = self.stacked()
+        return vmap(member, in_dims=in_dims, randomness='different')(params, buffers, *args)
+
+    def train(self, mode=True):
+        self.template.train(mode)
+        return super().train(mode)
+
+    def clip_grad_norm_(self, max_norm):
+        '''Clip the gradient of each member to max_norm, returning the K norms before clipping'''
+        grads = [p.grad for p in self.parameters() if p.grad is not None]
+        norms = torch.stack([g.reshape(g.size(0), -1).norm(dim=1) for g in grads], 1).norm(dim=1)
+        scale = (max_norm / (norms + 1e-6)).clamp(max=1.0)
+        for g in grads:
+            g.mul_(scale.view(-1, *([1] * (g.dim() - 1))))
+        return norms
+
+    def members(self):
+        '''The K members as ordinary modules holding a copy of their current weights'''
+        params, buffers = self.stacked()
+        members = []
+        for k in range(self.n_members):
+            model = copy.deepcopy(self.template)
+            with torch.no_grad():
+                for name, p in model.named_parameters():
+                    p.copy_(params[name][k])
+                for name, b in model.named_buffers():
+                    b.copy_(buffers[name][k])
+            members.append(model)
+        return members
+
+def member_losses(loss, model, y_pred, *targets):
+    '''loss(y_pred, *targets), or for an Ensemble the (K,) stack of the members' losses'''
+    if isinstance(model, Ensemble):
+        return torch.stack([loss(p, *targets) for p in y_pred])
+    return loss(y_pred, *targets)
+
+def clip_grad_norm(model, clip):
+    if isinstance(model, Ensemble):
+        return model.clip_grad_norm_(clip)
+    return torch.nn.utils.clip_grad_norm_(model.parameters(), clip)
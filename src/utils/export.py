@@ -0,0 +1,79 @@
+import logging
+
+import torch
+import torch.nn as nn
+from torch.nn.utils import parametrize
+from torch.nn.utils.weight_norm import WeightNorm
+from torch.ao.quantization import quantize_dynamic, default_dynamic_qconfig
+
+from src.monitors.baseclasses import Monitor
+
+def fold_weight_norm(model):
+    '''
+    Replace every weight norm reparametrisation in model by the plain weight
+    it currently computes, so it is not recomputed on every forward.
+    '''
+    n = 0
+    for module in model.modules():
+        for hook in list(module._forward_pre_hooks.values()):
+            if isinstance(hook, WeightNorm):
+                nn.utils.remove_weight_norm(module, hook.name)
+                n += 1
+        if parametrize.is_parametrized(module):
+            for name in list(module.parametrizations.keys()):
+                parametrize.remove_parametrizations(module, name, leave_parametrized=True)
+                n += 1
+    logging.info("Folded {} weight norm reparametrisations".format(n))
+    return model
+
+def _is_monitor(value):
+    if isinstance(value, (list, tuple)):
+        return len(value) > 0 and all(isinstance(v, Monitor) for v in value)
+    return isinstance(value, Monitor)
+
+def strip_monitors(model):
+    '''Switch off and remove the training-time monitors held by the modules of model'''
+    for module in model.modules():
+        if hasattr(module, 'monitoring'):
+            module.monitoring = False
+        for name, value in list(vars(module).items()):
+            if _is_monitor(value):
+                delattr(module, name)
+    return model
+
+def freeze_for_inference(model):
+    '''eval mode, no gradients, weight norm folded, monitors removed'''
+    model.eval()
+    fold_weight_norm(model)
+    strip_monitors(model)
+    for p in model.parameters():
+        p.requires_grad_(False)
+    return model
+
+def quantize_model(model):
+    '''
+    Dynamic int8 quantization of the Linear layers of model, for CPU inference.
+    Weights are quantized ahead of time and activations on the fly, so no
+    calibration data is needed. Linear layers whose weight is read directly
+    (the fused attention projections) are left in float.
+    '''
+    model = freeze_for_inference(model).cpu()
+    qconfig_spec = {
+        name: default_dynamic_qconfig for name, module in model.named_modules()
+        if type(module) is nn.Linear and not name.endswith('w_qkv')
+    }
+    logging.info("Quantizing {} Linear layers to int8".format(len(qconfig_spec)))
+    return quantize_dynamic(model, qconfig_spec, dtype=torch.qint8)
+
+def trace_and_save(module, example_inputs, path, check_inputs=None):
+    '''
+    Trace module on example_inputs (a tuple), checking the trace against
+    check_inputs (a list of tuples), freeze it and save it to path.
+    The result loads with torch.jit.load alone.
+    '''
+    with torch.no_grad():
+        traced = torch.jit.trace(module.eval(), example_inputs, check_inputs=check_inputs)
+    traced = torch.jit.freeze(traced)
+    torch.jit.save(traced, path)
+    logging.info("Saved the traced model to {}".format(path))
+    return traced
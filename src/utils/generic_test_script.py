@@ -4,12 +4,15 @@ import logging
 import time
 import csv
 import os
+import copy
+from concurrent.futures import ThreadPoolExecutor
 
 import torch
 import torch.nn.functional as F
 
 from src.data_ops.wrapping import unwrap
 from src.utils import load_model
+from src.utils.export import quantize_model
 
 def get_model_filenames(models_dir=None, model=None, single_model=None):
     #import ipdb; ipdb.set_trace()
@@ -24,21 +27,67 @@ def get_model_filenames(models_dir=None, model=None, single_model=None):
     #import ipdb; ipdb.set_trace()
     return model_filenames
 
-def test_all_models(test_one_model, model_dict, model_filenames, data_loader, administrator):
-    for i, filename in enumerate(model_filenames):
+def load_for_testing(model_dict, filename, quantize=False):
+    '''
+    The model saved in filename, or with quantize its quantized copy. The
+    float model is returned alongside (None without quantize), so that the
+    two can be compared.
+    '''
+    model, _ = load_model(model_dict, filename)
+    logging.info("Loaded {}".format(filename))
+
+    if quantize:
+        return quantize_model(copy.deepcopy(model)), model
+    return model, None
+
+def test_all_models(test_one_model, model_dict, model_filenames, data_loader, administrator, quantize=False, compare_quantized=None, validate_models=None, group_size=1, threads=0):
+    '''
+    With group_size > 1 (and a validate_models function), the models are
+    loaded group_size at a time and each group is evaluated in a single pass
+    over the data, optionally on a pool of threads.
+
+    With quantize and a compare_quantized function, the float models are
+    evaluated too, and the accuracy deltas it returns and the latency delta
+    (seconds per model over the test set, int8 - float) are logged with the
+    results of the quantized models.
+    '''
+    if quantize and torch.cuda.is_available():
+        logging.warning("Quantized models run on the CPU: run with --gpu '' so that the data stays on the CPU")
+    if validate_models is None:
+        group_size = 1
+    executor = ThreadPoolExecutor(max_workers=threads) if threads > 0 and group_size > 1 else None
+
+    def evaluate(models):
+        t_valid = time.time()
+        if len(models) == 1:
+            logdicts = [test_one_model(models[0], data_loader)]
+        else:
+            logdicts = validate_models(models, data_loader, executor=executor)
+        return logdicts, (time.time() - t_valid) / len(models)
+
+    for start in range(0, len(model_filenames), group_size):
         logging.info("\n")
-        model, _ = load_model(model_dict, filename)
-        logging.info("Loaded {}. Now testing".format(filename))
+        filenames = model_filenames[start:start + group_size]
+        models, float_models = zip(*[load_for_testing(model_dict, filename, quantize) for filename in filenames])
+        logging.info("Now testing {} model(s)".format(len(models)))
 
-        administrator.set_model(model)
+        logdicts, seconds = evaluate(models)
+        logging.info("Testing took {:.1f} seconds".format(seconds * len(models)))
 
-        t_valid = time.time()
-        logdict = test_one_model(model, data_loader)
-        logdict['model'] = filename
-        logging.info("Testing took {:.1f} seconds".format(time.time() - t_valid))
+        if quantize and compare_quantized is not None:
+            float_logdicts, float_seconds = evaluate(float_models)
+            logging.info("latency per model: float {:.2f}s, int8 {:.2f}s".format(float_seconds, seconds))
+            for logdict, float_logdict in zip(logdicts, float_logdicts):
+                logdict.update(compare_quantized(float_logdict, logdict))
+                logdict['latency_delta'] = seconds - float_seconds
 
-        #t_log = time.time()
-        administrator.log(**logdict)
+        for filename, model, logdict in zip(filenames, models, logdicts):
+            administrator.set_model(model)
+            logdict['model'] = filename
+            administrator.log(**logdict)
+
+    if executor is not None:
+        executor.shutdown()
 
 
 def generic_test_script(problem=None,args=None):
@@ -49,6 +98,8 @@ def generic_test_script(problem=None,args=None):
     test_one_model = problem.validation
     argument_converter = problem.test_argument_converter
     MODEL_DICT = problem.MODEL_DICT
+    compare_quantized = getattr(problem, 'compare_quantized', None)
+    validate_models = getattr(problem, 'validate_models', None)
 
     #ModelBuilder = problem.ModelBuilder
     get_test_data_loader = problem.get_test_data_loader
@@ -73,5 +124,16 @@ def generic_test_script(problem=None,args=None):
 
 
     data_loader = get_test_data_loader(**arg_groups['data_loader_kwargs'])
-    test_all_models(test_one_model, MODEL_DICT, model_filenames, data_loader, administrator)
+    test_all_models(
+        test_one_model,
+        MODEL_DICT,
+        model_filenames,
+        data_loader,
+        administrator,
+        quantize=getattr(args, 'quantize', False),
+        compare_quantized=compare_quantized,
+        validate_models=validate_models,
+        group_size=getattr(args, 'group_size', 1),
+        threads=getattr(args, 'threads', 0),
+        )
     administrator.finished()
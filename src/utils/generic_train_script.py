@@ -26,10 +26,13 @@ from src.admin.utils import see_tensors_in_memory
 from src.admin.utils import log_gpu_usage
 from src.admin.utils import compute_model_size
 from src.admin.utils import format_bytes
+from src.utils.ensemble import Ensemble
+from src.utils.oom import OOMSplitter
+from src.data_ops.micro_batches import batch_shape
 
 def do_training(
         train_one_batch,
-        validation,
+        validate_models,
         model,
         settings,
         train_data_loader,
@@ -42,16 +45,22 @@ def do_training(
         time_limit=None,
         clip=None,
         debug=None,
+        autocast=False,
+        fp32_every=0,
+        fp32_summary=None,
+        micro_batch=None,
         ):
 
     def train_one_epoch(epoch, iteration):
 
         train_loss = 0.0
         t_train = time.time()
+        splitter.n_splits = 0
 
         for batch_number, batch in enumerate(train_data_loader):
             iteration += 1
-            tl = train_one_batch(model, batch, optimizer, administrator, epoch, batch_number, clip)
+            step = lambda micro_batch: train_one_batch(model, batch, optimizer, administrators[0], epoch, batch_number, clip, autocast=autocast, micro_batch=micro_batch)
+            tl = splitter(step, batch_shape(batch), micro_batch)
             train_loss += tl
 
         scheduler.step()
@@ -60,7 +69,8 @@ def do_training(
 
         train_loss = train_loss / n_batches
         train_time = time.time() - t_train
-        logging.info("Training {} batches took {:.1f} seconds at {:.1f} examples per second".format(n_batches, train_time, len(train_data_loader.dataset)/train_time))
+        throughput = len(train_data_loader.dataset)/train_time
+        logging.info("Training {} batches took {:.1f} seconds at {:.1f} examples per second".format(n_batches, train_time, throughput))
 
         train_dict = dict(
             train_loss=train_loss,
@@ -68,22 +78,23 @@ def do_training(
             epoch=epoch,
             iteration=iteration,
             time=train_time,
+            throughput=throughput,
+            oom_splits=splitter.n_splits,
             )
 
         return train_dict
 
     t_start = time.time()
-    administrator = administrator
+    # an Ensemble is trained as one model, but each member has its own administrator
+    ensemble = isinstance(model, Ensemble)
+    administrators = administrator if ensemble else [administrator]
+    # batches that run out of memory are retried in smaller micro-batches
+    splitter = OOMSplitter()
 
     logging.info("Training...")
     iteration=1
     #log_gpu_usage()
 
-    static_dict = dict(
-        model=model,
-        settings=settings,
-    )
-
     for epoch in range(1,epochs+1):
         logging.info("Epoch\t{}/{}".format(epoch, epochs))
         #logging.info("lr = {:.8f}".format(scheduler.get_lr()[0]))
@@ -91,14 +102,21 @@ def do_training(
         t0 = time.time()
 
         train_dict = train_one_epoch(epoch, iteration)
-        valid_dict = validation(model, valid_data_loader)
+        members = model.members() if ensemble else [model]
+        valid_dicts = validate_models(members, valid_data_loader, autocast=autocast)
+        if autocast and fp32_every > 0 and epoch % fp32_every == 0:
+            # the float32 metrics of the same weights, to compare against
+            for valid_dict, fp32_dict in zip(valid_dicts, validate_models(members, valid_data_loader)):
+                valid_dict.update(fp32_summary(fp32_dict))
         #valid_dict = self.validation(model, dummy_train_data_loader)
-        logdict = {**train_dict, **valid_dict, **static_dict}
 
         iteration = train_dict['iteration']
 
         t_log = time.time()
-        administrator.log(**logdict)
+        for k, (administrator, member, valid_dict) in enumerate(zip(administrators, members, valid_dicts)):
+            member_train_dict = dict(train_dict, train_loss=train_dict['train_loss'][k]) if ensemble else train_dict
+            logdict = {**member_train_dict, **valid_dict, 'model': member, 'settings': settings}
+            administrator.log(**logdict)
         logging.info("Logging took {:.1f} seconds".format(time.time() - t_log))
 
         t1 = time.time()
@@ -108,7 +126,8 @@ def do_training(
         if t1 - t_start > time_limit:
             break
 
-    administrator.finished()
+    for administrator in administrators:
+        administrator.finished()
 
 def generic_train_script(problem=None,args=None):
     '''----------------------------------------------------------------------- '''
@@ -121,7 +140,7 @@ def generic_train_script(problem=None,args=None):
     argument_converter = problem.train_argument_converter
     train_monitor_collection = problem.train_monitor_collection
     train_one_batch = problem.train_one_batch
-    validation = problem.validation
+    validate_models = problem.validate_models
     MODEL_DICT = problem.MODEL_DICT
     get_train_data_loader = problem.get_train_data_loader
 
@@ -135,9 +154,24 @@ def generic_train_script(problem=None,args=None):
     ''' ADMINISTRATOR '''
     '''----------------------------------------------------------------------- '''
 
-    administrator = Administrator.train(
-        **arg_groups['admin_kwargs']
-    )
+    n_members = getattr(args, 'ensemble', 1)
+    if n_members > 1:
+        if args.load is not None:
+            raise ValueError("Cannot train an ensemble from a loaded model ({})".format(args.load))
+        # one administrator per member, each with its own monitors and stats:
+        # the members share an experiment directory and get a leaf each
+        member_arg_groups = [arg_groups] + [argument_converter(args) for _ in range(n_members - 1)]
+        job_id = args.slurm_array_job_id or Administrator.get_experiment_dirname(None, train=True)
+        administrators = []
+        for k, member_args in enumerate(member_arg_groups):
+            admin_kwargs = member_args['admin_kwargs']
+            task_id = admin_kwargs['slurm_array_task_id']
+            admin_kwargs['slurm_array_job_id'] = job_id
+            admin_kwargs['slurm_array_task_id'] = '{}-{}'.format(task_id, k) if task_id is not None else str(k)
+            administrators.append(Administrator.train(**admin_kwargs))
+    else:
+        administrators = [Administrator.train(**arg_groups['admin_kwargs'])]
+    administrator = administrators[0]
 
     '''----------------------------------------------------------------------- '''
     ''' DATA '''
@@ -155,18 +189,28 @@ def generic_train_script(problem=None,args=None):
         model, settings = load_model(MODEL_DICT, args.load, logger=administrator.logger)
         with open(os.path.join(model_filename, 'settings.pickle'), "rb") as f:
             settings = pickle.load(f)
+        models = [model]
     else:
         model_kwargs = arg_groups['model_kwargs']
         model_kwargs['features'] = train_data_loader.dim
-        model = build_model(MODEL_DICT, model_kwargs, logger=administrator.logger)
+        # the members are initialised one after the other from the same seed
+        models = [build_model(MODEL_DICT, model_kwargs, logger=a.logger) for a in administrators]
         settings = {
         "model_kwargs": model_kwargs,
+        # the frozen input preprocessing, reused at scoring time (None if the problem has none)
+        "normalization": getattr(train_data_loader.dataset, 'tf', None),
         #"optim_args": optim_args,
         #"training_args": training_args
         }
-    logging.info("Model size is {}".format(format_bytes(compute_model_size(model))))
-    administrator.set_model(model)
-    administrator.save(model, settings)
+    logging.info("Model size is {}".format(format_bytes(compute_model_size(models[0]))))
+    # built before anything is saved, as it rejects models it cannot train
+    ensemble = Ensemble(models) if n_members > 1 else None
+    for a, model in zip(administrators, models):
+        a.set_model(model)
+        a.save(model, settings)
+    if ensemble is not None:
+        model = ensemble
+        logging.info("Training an ensemble of {} members in one process".format(n_members))
 
     '''----------------------------------------------------------------------- '''
     ''' OPTIMIZER AND SCHEDULER '''
@@ -186,7 +230,7 @@ def generic_train_script(problem=None,args=None):
 
     do_training(
         train_one_batch,
-        validation,
+        validate_models,
         model,
         settings,
         train_data_loader,
@@ -194,6 +238,7 @@ def generic_train_script(problem=None,args=None):
         dummy_train_data_loader,
         optimizer,
         scheduler,
-        administrator,
+        administrators if n_members > 1 else administrator,
+        fp32_summary=problem.fp32_summary,
         **arg_groups['training_kwargs']
     )
@@ -13,7 +13,7 @@ def load_settings(filename):
 
 def load_model_state_dict(model, path_to_state_dict):
     with open(os.path.join(path_to_state_dict, 'model_state_dict.pt'), 'rb') as f:
-        state_dict = torch.load(f)
+        state_dict = torch.load(f, map_location='cpu')
     model.load_state_dict(state_dict)
 
 def build_model_from_kwargs(model_dict, model_kwargs, **kwargs):
@@ -0,0 +1,62 @@
+import gc
+import logging
+
+import torch
+
+OOM_MESSAGES = [
+    'out of memory',
+    # the CPU allocator
+    "can't allocate memory",
+]
+
+def is_oom(error):
+    '''Whether error is a failure to allocate memory, on a GPU or on the CPU'''
+    if isinstance(error, torch.cuda.OutOfMemoryError):
+        return True
+    return isinstance(error, RuntimeError) and any(m in str(error) for m in OOM_MESSAGES)
+
+def free_memory():
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+class OOMSplitter:
+    '''
+    Runs training steps that may run out of memory. A step that does is
+    retried on the same batch split into micro-batches of half the size, then
+    of a quarter, and so on. The (size, length) of the micro-batches that
+    failed are remembered, so that later batches at least as large are split
+    up front. n_splits counts the retries.
+    '''
+    def __init__(self):
+        self.failed = []
+        self.n_splits = 0
+
+    def size_for(self, length, size):
+        while size > 1 and any(size >= s and length >= l for s, l in self.failed):
+            size = (size + 1) // 2
+        return size
+
+    def __call__(self, step, shape, micro_batch=None):
+        '''
+        step(micro_batch) trains on the whole batch, of shape
+        (n_examples, length), in micro-batches of at most micro_batch
+        examples (or all at once if None). With no shape, the batch cannot
+        be split and step is run as is.
+        '''
+        if shape is None:
+            return step(micro_batch)
+        n_examples, length = shape
+        size = self.size_for(length, min(micro_batch or n_examples, n_examples))
+        while True:
+            try:
+                return step(size if size < n_examples else None)
+            except RuntimeError as e:
+                if not is_oom(e) or size == 1:
+                    raise
+            # out of the except clause, so that the failed attempt is freed
+            self.failed.append((size, length))
+            self.n_splits += 1
+            free_memory()
+            logging.warning("Out of memory on {} examples of length {}: retrying in micro-batches of {}".format(size, length, (size + 1) // 2))
+            size = (size + 1) // 2
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules import each other as src.*, from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
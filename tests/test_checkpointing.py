@@ -0,0 +1,23 @@
+import copy
+
+import pytest
+
+torch = pytest.importorskip('torch')
+nn = torch.nn
+
+from src.architectures.utils import run_layers
+
+@pytest.mark.parametrize('every', [1, 2])
+def test_checkpointing_keeps_batch_norm_statistics(every):
+    torch.manual_seed(0)
+    layers = nn.ModuleList([nn.Sequential(nn.Linear(4, 4), nn.BatchNorm1d(4), nn.ReLU()) for _ in range(3)])
+    checkpointed = copy.deepcopy(layers)
+    x = torch.randn(8, 4, requires_grad=True)
+
+    run_layers(layers, x).sum().backward()
+    run_layers(checkpointed, x, every=every).sum().backward()
+
+    for a, b in zip(layers.buffers(), checkpointed.buffers()):
+        assert torch.equal(a, b)
+    for a, b in zip(layers.parameters(), checkpointed.parameters()):
+        assert torch.allclose(a.grad, b.grad, atol=1e-6)
@@ -0,0 +1,16 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+nn = torch.nn
+
+from src.utils.ensemble import Ensemble
+
+def test_ensemble_runs_every_member():
+    torch.manual_seed(0)
+    ensemble = Ensemble([nn.Linear(4, 2) for _ in range(3)])
+    assert ensemble(torch.randn(5, 4)).shape == (3, 5, 2)
+
+def test_batch_norm_is_rejected_at_build_time():
+    models = [nn.Sequential(nn.Linear(4, 4), nn.BatchNorm1d(4)) for _ in range(2)]
+    with pytest.raises(ValueError, match='batch norm'):
+        Ensemble(models)
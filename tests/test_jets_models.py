@@ -0,0 +1,45 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from src.data_ops.pad_tensors import pad_tensors_extra_channel
+from src.jets.models import MODEL_DICT
+
+MODEL_KWARGS = dict(
+    features=8,
+    hidden=16,
+    n_layers=2,
+    n_heads=2,
+    dq=8,
+    dv=8,
+    dropout=0.,
+    readout='set',
+    emb_init='1',
+    act='leakyrelu',
+    wn=False,
+    n_inducing=4,
+)
+
+def random_jets(lengths, features=7):
+    torch.manual_seed(0)
+    return [torch.randn(n, features) for n in lengths]
+
+def build(name):
+    torch.manual_seed(1)
+    return MODEL_DICT[name](**MODEL_KWARGS).eval()
+
+@pytest.mark.parametrize('name', ['tf', 'ist'])
+def test_forward(name):
+    model = build(name)
+    out = model(pad_tensors_extra_channel(random_jets([5, 9, 3])))
+    assert out.shape[0] == 3
+    assert torch.isfinite(out).all()
+
+@pytest.mark.parametrize('name', ['tf', 'ist'])
+def test_output_does_not_depend_on_padding(name):
+    model = build(name)
+    jets = random_jets([5, 9, 3])
+    with torch.no_grad():
+        together = model(pad_tensors_extra_channel(jets))
+        alone = torch.cat([model(pad_tensors_extra_channel([jet])) for jet in jets], 0)
+    assert torch.allclose(together, alone, atol=1e-6)
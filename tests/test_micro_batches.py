@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from src.data_ops.pad_tensors import pad_tensors_extra_channel
+from src.proteins.data_ops.tokens import N_TOKENS
+from src.jets.models import MODEL_DICT as JETS_MODEL_DICT
+from src.proteins.models import MODEL_DICT as PROTEINS_MODEL_DICT
+from src.jets.train import train_one_batch as train_jets
+from src.proteins.train import train_one_batch as train_proteins
+
+JETS_KWARGS = dict(features=8, hidden=8, iters=2, emb_init='1', readout='dtnn', matrix='dm', m_act='soft',
+                   symmetric=True, act='leakyrelu', wn=False, update='gru', message='2')
+LENGTHS = [3, 9, 5, 7]
+
+def gradients(build, train, batch, micro_batch):
+    torch.manual_seed(1)
+    model = build()
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.)
+    administrator = SimpleNamespace(logger=None)
+    l = train(model, batch, optimizer, administrator, 1, 0, None, micro_batch=micro_batch)
+    return l, [p.grad.clone() for p in model.parameters() if p.grad is not None]
+
+def assert_same_step(build, train, batch):
+    l, grads = gradients(build, train, batch, None)
+    for micro_batch in [1, 3]:
+        l_micro, grads_micro = gradients(build, train, batch, micro_batch)
+        assert l_micro == pytest.approx(l, rel=1e-5)
+        assert len(grads_micro) == len(grads)
+        for g, g_micro in zip(grads, grads_micro):
+            assert torch.allclose(g, g_micro, atol=1e-5)
+
+def test_jets_micro_batches_match_the_full_batch():
+    torch.manual_seed(0)
+    x = pad_tensors_extra_channel([torch.randn(n, JETS_KWARGS['features'] - 1) for n in LENGTHS])
+    y = torch.tensor([0., 1., 1., 0.])
+    assert_same_step(lambda: JETS_MODEL_DICT['nmp'](**JETS_KWARGS), train_jets, (x, y))
+
+def test_proteins_micro_batches_match_the_full_batch():
+    torch.manual_seed(0)
+    bs, n = len(LENGTHS), max(LENGTHS)
+    tokens = torch.randint(0, N_TOKENS + 1, (bs, n, 1)).float()
+    x = torch.cat([tokens, torch.randn(bs, n, 6), torch.zeros(bs, n, 1)], 2)
+    mask = torch.zeros(bs, n, n)
+    for i, length in enumerate(LENGTHS):
+        x[i, length:] = 0
+        x[i, length:, -1] = 1
+        mask[i, :length, :length] = 1
+    y = (torch.rand(bs, n, n) > 0.8).float() * mask
+    batch = (x, y, mask.clone(), mask)
+    build = lambda: PROTEINS_MODEL_DICT['g'](features=N_TOKENS + 7, hidden=8, iters=2, block='nmp')
+    assert_same_step(build, train_proteins, batch)
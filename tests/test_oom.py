@@ -0,0 +1,30 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from src.utils.oom import is_oom, OOMSplitter
+
+def test_cuda_out_of_memory_error():
+    assert is_oom(torch.cuda.OutOfMemoryError("CUDA error"))
+
+def test_cuda_out_of_memory_message():
+    assert is_oom(RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB"))
+
+def test_cpu_allocator_failure():
+    assert is_oom(RuntimeError("[enforce fail at alloc_cpu.cpp:114] data. DefaultCPUAllocator: can't allocate memory: you tried to allocate 8589934592 bytes."))
+
+def test_other_errors():
+    assert not is_oom(RuntimeError("shape mismatch"))
+    assert not is_oom(ValueError("out of memory"))
+
+def test_cpu_allocator_failure_is_split():
+    sizes = []
+    def step(micro_batch):
+        sizes.append(micro_batch)
+        if micro_batch is None:
+            raise RuntimeError("DefaultCPUAllocator: can't allocate memory: you tried to allocate 8589934592 bytes.")
+        return micro_batch
+    splitter = OOMSplitter()
+    assert splitter(step, (8, 10)) == 4
+    assert sizes == [None, 4]
+    assert splitter.n_splits == 1
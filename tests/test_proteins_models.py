@@ -0,0 +1,43 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from src.proteins.data_ops.tokens import N_TOKENS
+from src.proteins.models import MODEL_DICT
+
+def random_proteins(bs, n, features=6):
+    torch.manual_seed(0)
+    tokens = torch.randint(0, N_TOKENS + 1, (bs, n, 1)).float()
+    x = torch.cat([tokens, torch.randn(bs, n, features), torch.zeros(bs, n, 1)], 2)
+    mask = torch.ones(bs, n, n)
+    return x, mask
+
+def graphgen(**kwargs):
+    torch.manual_seed(1)
+    return MODEL_DICT['g'](features=N_TOKENS + 7, hidden=8, iters=3, block='nmp', **kwargs)
+
+@pytest.mark.parametrize('truncate', [1, 2])
+def test_truncation_keeps_the_output(truncate):
+    x, mask = random_proteins(2, 10)
+    full = graphgen()(x, mask=mask)
+    truncated = graphgen(truncate=truncate)(x, mask=mask)
+    assert torch.allclose(full, truncated)
+
+@pytest.mark.parametrize('truncate', [1, 2])
+def test_truncation_only_differentiates_the_last_blocks(truncate):
+    model = graphgen(truncate=truncate)
+    x, mask = random_proteins(2, 10)
+    model(x, mask=mask).sum().backward()
+    assert model.initial_embedding.weight.grad is None
+    for i, block in enumerate(model.nmp_blocks):
+        grads = [p.grad for p in block.update.parameters()]
+        if i < 3 - truncate:
+            assert all(g is None for g in grads)
+        else:
+            assert all(g is not None for g in grads)
+
+def test_no_grad_runs_at_full_depth_in_evaluation():
+    x, mask = random_proteins(2, 10)
+    full = graphgen().eval()(x, mask=mask)
+    model = graphgen(no_grad=True).eval()
+    assert torch.allclose(full, model(x, mask=mask))
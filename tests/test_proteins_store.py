@@ -0,0 +1,32 @@
+import os
+import pickle
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('torch')
+
+from src.proteins.data_ops.store import ProteinStore
+
+def write_records(filename, lengths):
+    records = [dict(
+        sequence='A' * n,
+        contactMatrix=np.zeros((n, n)),
+        ACC=np.zeros((n, 2), dtype=np.float32),
+        SS3=np.zeros((n, 3), dtype=np.float32),
+        ) for n in lengths]
+    with open(filename, 'wb') as f:
+        pickle.dump(records, f)
+
+def test_store_is_rebuilt_when_the_pickle_changes(tmp_path):
+    filename = str(tmp_path / 'train.pkl')
+    write_records(filename, [3, 4])
+    assert len(ProteinStore.from_pickle(filename)) == 2
+
+    write_records(filename, [3, 4, 5])
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    store = ProteinStore.from_pickle(filename)
+    assert len(store) == 3
+    assert len(store[2]) == 5
+    assert sorted(os.listdir(str(tmp_path))) == ['train.pkl', 'train_store']
@@ -0,0 +1,21 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from src.architectures.readout.set2set import Set2Vec
+
+def test_set2vec_ignores_padding():
+    torch.manual_seed(0)
+    readout = Set2Vec(6, 4, 8, steps=3)
+    x = torch.randn(1, 5, 6)
+    padded = torch.cat([x, torch.randn(1, 3, 6)], 1)
+    mask = torch.tensor([[1., 1., 1., 1., 1., 0., 0., 0.]])
+    assert torch.allclose(readout(x), readout(padded, mask), atol=1e-6)
+
+def test_set2vec_without_steps_runs_one_step_per_element():
+    torch.manual_seed(0)
+    readout = Set2Vec(6, 4, 8)
+    x = torch.randn(2, 5, 6)
+    out = readout(x)
+    readout.steps = 5
+    assert torch.equal(out, readout(x))
@@ -0,0 +1,21 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from src.jets.models import MODEL_DICT
+from src.jets.serve.serve_jets import JetScorer
+
+MODEL_KWARGS = dict(features=8, hidden=8, iters=2, emb_init='1', readout='dtnn', matrix='dm', m_act='soft',
+                    symmetric=True, act='leakyrelu', wn=False, update='gru', message='2')
+
+def test_score_does_not_depend_on_the_other_requests():
+    torch.manual_seed(1)
+    scorer = JetScorer(MODEL_DICT['nmp'](**MODEL_KWARGS), lambda c: c)
+    torch.manual_seed(0)
+    jet = torch.randn(4, 7).numpy()
+    others = [torch.randn(n, 7).numpy() for n in [9, 4, 2]]
+
+    alone = scorer([jet])[0]
+    mixed = scorer(others[:1] + [jet] + others[1:])
+    assert mixed[1] == pytest.approx(alone, abs=1e-6)
+    assert len(mixed) == 4